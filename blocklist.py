@@ -0,0 +1,112 @@
+"""
+Compiled blocklist matchers for Brain Candy Bot
+
+Blocklists are compiled once at import time:
+- DomainMatcher: a trie of reversed domain labels, so "ft.com" matches
+  ft.com and www.ft.com but not microsoft.com
+- KeywordMatcher: an Aho-Corasick automaton, so a title is scanned once
+  no matter how many keywords there are
+
+Both keep per-rule hit counters.
+"""
+
+import threading
+from collections import Counter, deque
+
+
+class DomainMatcher:
+    """Match hosts against a list of domains by label suffix."""
+
+    def __init__(self, domains):
+        self._root = {}
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        for domain in domains:
+            node = self._root
+            for label in reversed(domain.lower().strip(".").split(".")):
+                node = node.setdefault(label, {})
+            node[None] = domain  # None marks the end of a rule
+
+    def match(self, host: str):
+        """Return the rule matching this host (or one of its parents), or None."""
+        host = host.lower().split(":")[0].strip(".")
+        node = self._root
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                return None
+            if None in node:
+                rule = node[None]
+                self.count(rule)
+                return rule
+        return None
+
+    def count(self, rule: str, n: int = 1):
+        """Record n hits for a rule."""
+        with self._lock:
+            self.hits[rule] += n
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton for finding any of many keywords in a string."""
+
+    def __init__(self, keywords):
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        # Each state: goto transitions, failure link, and the keyword ending here
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+
+        for keyword in keywords:
+            state = 0
+            for char in keyword.lower():
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(None)
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            if self._output[state] is None:
+                self._output[state] = keyword
+
+        # Breadth-first pass to fill in failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                if self._output[child] is None:
+                    self._output[child] = self._output[self._fail[child]]
+
+    def search(self, text: str):
+        """Return the first keyword found in text (case-insensitive), or None."""
+        state = 0
+        for char in text.lower():
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            keyword = self._output[state]
+            if keyword is not None:
+                self.count(keyword)
+                return keyword
+        return None
+
+    def count(self, keyword: str, n: int = 1):
+        """Record n hits for a keyword matched outside search (e.g. in a batch)."""
+        with self._lock:
+            self.hits[keyword] += n
+
+
+def hits_report(matchers: dict, n: int = 10) -> str:
+    """Format the most-hit rules for each named matcher."""
+    lines = []
+    for name, matcher in matchers.items():
+        lines.append(f"{name}:")
+        for rule, count in matcher.hits.most_common(n):
+            lines.append(f"  {count:5d}  {rule}")
+    return "\n".join(lines)
@@ -1,16 +1,33 @@
-import feedparser
-import requests
-import json
+import html
 import os
-import time
 import random
 from datetime import datetime, timedelta
 from pathlib import Path
-from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
+from urllib.parse import urlparse
 from zoneinfo import ZoneInfo
 
 from feeds import FEEDS, BLOCKED_DOMAINS, BLOCKED_KEYWORDS
 from canonical import CANONICAL_READINGS
+from urls import fix_known_redirects, normalize_url
+from url_index import url_hash
+from blocklist import DomainMatcher, KeywordMatcher, hits_report
+from source_policy import SourcePolicy
+from url_resolver import reset_budget, resolve_canonical
+from neardup import NearDupIndex, find_near_duplicate, remember
+from scoring import BAD_TITLE_MATCHER, score_batch
+from title_model import get_model
+from similarity import get_index
+from post_queue import PostQueue
+import state
+import http_client
+import outbox
+import telegram_api
+import updates
+from fetcher import fetch_all
+from feed_cache import fetch_entries, cached_entries, save_feed_cache
+from feed_state import (
+    entries_since_watermark, commit_watermarks, schedule_next_poll, is_due, due_feeds, save_feed_state,
+)
 
 # Hacker News API settings
 HN_API_URL = "https://hn.algolia.com/api/v1/search"
@@ -23,41 +40,10 @@ HN_PREFERRED_DOMAINS = [
     "waitbutwhy.com", "nadia.xyz", "vitalik.eth.limo", "patrickcollison.com",
     "marginalrevolution.com", "elidourado.com", "noahpinion.substack.com",
 ]
-
-
-def fix_known_redirects(url: str) -> str:
-    """Fix known broken/redirect URLs from feeds."""
-    # Vitalik's blog moved from vitalik.ca to vitalik.eth.limo
-    if "vitalik.ca/" in url:
-        url = url.replace("vitalik.ca/", "vitalik.eth.limo/")
-    return url
-
-
-def normalize_url(url: str) -> str:
-    """Normalize URL for deduplication only - don't use for posting."""
-    if not url:
-        return url
-
-    parsed = urlparse(url)
-
-    # Force https, lowercase domain only (not path)
-    scheme = "https"
-    netloc = parsed.netloc.lower()
-
-    # Remove trailing slash from path (keep original case)
-    path = parsed.path.rstrip("/")
-
-    # Remove tracking parameters
-    tracking_params = {"utm_source", "utm_medium", "utm_campaign", "utm_content", "utm_term", "ref", "source"}
-    query_params = parse_qs(parsed.query)
-    filtered_params = {k: v for k, v in query_params.items() if k.lower() not in tracking_params}
-    query = urlencode(filtered_params, doseq=True) if filtered_params else ""
-
-    return urlunparse((scheme, netloc, path, "", query, ""))
+HN_PREFERRED_MATCHER = DomainMatcher(HN_PREFERRED_DOMAINS)
 
 
 # === CONFIGURATION ===
-TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "YOUR_TOKEN_HERE")
 TELEGRAM_CHANNEL_ID = os.environ.get("TELEGRAM_CHANNEL_ID", "@candyforthebrain")
 
 # Training mode - send to Andy directly for review
@@ -66,15 +52,8 @@ ANDY_CHAT_ID = "1023849161"
 # Scoring thresholds
 MIN_SCORE_THRESHOLD = 0.45  # Only post articles scoring above this
 
-# Files for tracking state
-DATA_DIR = Path(__file__).parent
-POSTED_FILE = DATA_DIR / "posted.json"
-TRAINING_LOG_FILE = DATA_DIR / "training_log.json"
-QUEUE_FILE = DATA_DIR / "queue.json"
-PENDING_REVIEW_FILE = DATA_DIR / "pending_review.json"
-DAILY_SOURCES_FILE = DATA_DIR / "daily_sources.json"  # Track sources posted today
-APPROVED_FILE = DATA_DIR / "approved.json"  # Articles approved by Andy, ready to post
-REJECTED_SOURCES_FILE = DATA_DIR / "rejected_sources.json"  # Sources Andy has rejected
+# Bot state (posted, training log, queue, reviews, sources) lives in state.db - see state.py
+DATA_DIR = Path(os.environ.get("BRAIN_CANDY_DATA_DIR") or Path(__file__).parent)
 
 # URLs Andy already shared (don't send these for review)
 ALREADY_SEEN_URLS = [
@@ -96,6 +75,11 @@ PREMIUM_KEYWORDS = [
     "for paying subscribers", "member-only",
 ]
 
+# Blocklists compiled once at import time (see blocklist.py)
+ALREADY_SEEN_NORMALIZED = frozenset(normalize_url(url) for url in ALREADY_SEEN_URLS)
+BLOCKED_DOMAIN_MATCHER = DomainMatcher(BLOCKED_DOMAINS)
+BLOCKED_TITLE_MATCHER = KeywordMatcher(BLOCKED_KEYWORDS + PREMIUM_KEYWORDS)
+
 # Temporarily paused sources (too much recently) - expires after date
 # Format: source name or domain -> expiration date (YYYY-MM-DD)
 PAUSED_SOURCES = {
@@ -109,75 +93,62 @@ PAUSED_SOURCES = {
     "nintil.com": "2026-02-18",
 }
 
+# Rejected / paused / blocked source rules with O(1) checks (see source_policy.py)
+SOURCE_POLICY = SourcePolicy(PAUSED_SOURCES, BLOCKED_DOMAIN_MATCHER)
+
 
 def is_source_paused(source: str, url: str = "") -> bool:
     """Check if a source is temporarily paused."""
     today = datetime.now().strftime("%Y-%m-%d")
-
-    # Check source name
-    if source in PAUSED_SOURCES:
-        if PAUSED_SOURCES[source] >= today:
-            return True
-
-    # Check domain in URL
-    if url:
-        domain = urlparse(url).netloc.replace("www.", "").lower()
-        for paused_domain, expiry in PAUSED_SOURCES.items():
-            if paused_domain in domain and expiry >= today:
-                return True
-
-    return False
+    return SOURCE_POLICY.is_paused(source, url, today)
 
 
 def is_source_rejected(source: str, url: str = "") -> bool:
     """Check if a source has been rejected by Andy."""
-    rejected = load_json(REJECTED_SOURCES_FILE, {"sources": [], "domains": []})
-
-    # Check source name
-    if source in rejected.get("sources", []):
-        return True
-
-    # Check domain
-    if url:
-        domain = urlparse(url).netloc.replace("www.", "").lower()
-        for rejected_domain in rejected.get("domains", []):
-            if rejected_domain in domain:
-                return True
-
-    return False
+    return SOURCE_POLICY.is_rejected(source, url)
 
 
 def add_rejected_source(source: str, url: str = ""):
     """Add a source to the rejected list."""
-    rejected = load_json(REJECTED_SOURCES_FILE, {"sources": [], "domains": []})
-
     # Add source name
-    if source and source not in rejected["sources"]:
-        rejected["sources"].append(source)
+    if source and state.add_rejected("source", source):
         print(f"Blocked source: {source}")
 
     # Add domain
     if url:
         domain = urlparse(url).netloc.replace("www.", "").lower()
-        if domain and domain not in rejected["domains"]:
-            rejected["domains"].append(domain)
+        if domain and state.add_rejected("domain", domain):
             print(f"Blocked domain: {domain}")
 
-    save_json(REJECTED_SOURCES_FILE, rejected)
+    SOURCE_POLICY.invalidate()
 
 
 def add_source_to_feeds(name: str, url: str, domain: str = ""):
     """Add an approved source to feeds.py."""
+    return add_sources_to_feeds([{"name": name, "url": url, "domain": domain}]) == 1
+
+
+def add_sources_to_feeds(sources: list) -> int:
+    """Add approved sources ({name, url, domain}) to feeds.py in one rewrite. Returns how many were added."""
     feeds_file = DATA_DIR / "feeds.py"
 
     try:
         with open(feeds_file, "r") as f:
             content = f.read()
 
-        # Check if already exists
-        if url in content or (domain and domain in content):
-            print(f"Source already in feeds.py: {name}")
-            return False
+        new_entries = []
+        added = []
+        for source in sources:
+            name, url, domain = source["name"], source["url"], source.get("domain", "")
+            # Check if already exists
+            if url in content or (domain and domain in content) or any(url in e for e in new_entries):
+                print(f"Source already in feeds.py: {name}")
+                continue
+            new_entries.append(f'\n    {{"name": "{name}", "url": "{url}", "category": "Discovered"}},  # Auto-approved')
+            added.append(f"{name} ({domain})")
+
+        if not new_entries:
+            return 0
 
         # Find the FEEDS list end (before BLOCKED_DOMAINS)
         insert_marker = "# Domains to skip"
@@ -188,41 +159,27 @@ def add_source_to_feeds(name: str, url: str, domain: str = ""):
 
         if insert_pos == -1:
             print("Could not find insert position in feeds.py")
-            return False
+            return 0
 
         # Go back to find the last feed entry
         last_bracket = content.rfind("},", 0, insert_pos)
         if last_bracket == -1:
             print("Could not find last feed entry")
-            return False
-
-        # Create new entry
-        new_entry = f'\n    {{"name": "{name}", "url": "{url}", "category": "Discovered"}},  # Auto-approved'
+            return 0
 
         # Insert
-        new_content = content[:last_bracket + 2] + new_entry + content[last_bracket + 2:]
+        new_content = content[:last_bracket + 2] + "".join(new_entries) + content[last_bracket + 2:]
 
         with open(feeds_file, "w") as f:
             f.write(new_content)
 
-        print(f"Added to feeds.py: {name} ({domain})")
-        return True
+        for source in added:
+            print(f"Added to feeds.py: {source}")
+        return len(new_entries)
 
     except Exception as e:
         print(f"Error adding source to feeds.py: {e}")
-        return False
-
-
-def load_json(filepath, default):
-    if filepath.exists():
-        with open(filepath, "r") as f:
-            return json.load(f)
-    return default
-
-
-def save_json(filepath, data):
-    with open(filepath, "w") as f:
-        json.dump(data, f, indent=2)
+        return 0
 
 
 def get_today_date() -> str:
@@ -233,93 +190,56 @@ def get_today_date() -> str:
 
 def load_daily_sources() -> set:
     """Load sources that have already been posted today. Resets at midnight Chicago time."""
-    data = load_json(DAILY_SOURCES_FILE, {"date": None, "sources": []})
-    today = get_today_date()
-
-    # If it's a new day, reset the tracking
-    if data.get("date") != today:
-        return set()
-
-    return set(data.get("sources", []))
+    return state.get_daily_sources(get_today_date())
 
 
 def save_daily_source(source: str):
-    """Add a source to today's posted sources."""
-    data = load_json(DAILY_SOURCES_FILE, {"date": None, "sources": []})
-    today = get_today_date()
-
-    # Reset if new day
-    if data.get("date") != today:
-        data = {"date": today, "sources": []}
-
-    if source not in data["sources"]:
-        data["sources"].append(source)
-
-    save_json(DAILY_SOURCES_FILE, data)
+    """Add a source to today's posted sources (older days are dropped)."""
+    state.add_daily_source(get_today_date(), source)
 
 
 def is_blocked(url: str, title: str = "") -> bool:
     url_lower = url.lower()
-    title_lower = title.lower()
-    normalized = normalize_url(url)
 
     # Block action URLs (votes, logins, etc.)
     if "/vote?" in url_lower or "/login" in url_lower or "/submit" in url_lower:
         return True
 
     # Check if already seen
-    if any(normalize_url(seen_url) == normalized for seen_url in ALREADY_SEEN_URLS):
+    if normalize_url(url) in ALREADY_SEEN_NORMALIZED:
         return True
 
-    # Check blocked domains
-    for domain in BLOCKED_DOMAINS:
-        if domain in url_lower:
-            return True
-
-    # Check blocked keywords
-    for keyword in BLOCKED_KEYWORDS:
-        if keyword in title_lower:
-            return True
+    # Check blocked domains (host or any parent domain)
+    if BLOCKED_DOMAIN_MATCHER.match(urlparse(url).netloc):
+        return True
 
-    # Check premium/paywall keywords
-    for keyword in PREMIUM_KEYWORDS:
-        if keyword in title_lower:
-            return True
+    # Check blocked and premium/paywall keywords
+    if BLOCKED_TITLE_MATCHER.search(title):
+        return True
 
     return False
 
 
-def send_message(chat_id: str, text: str) -> bool:
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+def blocklist_report() -> str:
+    """Most-hit blocklist rules this run."""
+    return hits_report({
+        "Blocked domains": BLOCKED_DOMAIN_MATCHER,
+        "Blocked title keywords": BLOCKED_TITLE_MATCHER,
+        "Bad title patterns": BAD_TITLE_MATCHER,
+    })
+
+
+def send_message(chat_id: str, text: str, key: str = None, reply_markup: dict = None,
+                 preview: bool = True) -> bool:
+    """Send through the outbox (rate limited, retried). key makes the send idempotent."""
     payload = {
-        "chat_id": chat_id,
         "text": text,
         "parse_mode": "HTML",
-        "disable_web_page_preview": False,
+        "disable_web_page_preview": not preview,
     }
-    
-    try:
-        response = requests.post(url, json=payload, timeout=10)
-        return response.status_code == 200
-    except Exception as e:
-        print(f"Error sending message: {e}")
-        return False
-
-
-def get_updates(offset=None):
-    """Get new messages sent to the bot"""
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
-    params = {"timeout": 5}
-    if offset:
-        params["offset"] = offset
-    
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 200:
-            return response.json().get("result", [])
-    except Exception as e:
-        print(f"Error getting updates: {e}")
-    return []
+    if reply_markup:
+        payload["reply_markup"] = reply_markup
+    return outbox.send(chat_id, payload, key)
 
 
 def fetch_hacker_news(min_points: int = HN_MIN_POINTS, max_articles: int = 30) -> list:
@@ -334,7 +254,7 @@ def fetch_hacker_news(min_points: int = HN_MIN_POINTS, max_articles: int = 30) -
             "hitsPerPage": 50,
         }
 
-        response = requests.get(HN_API_URL, params=params, timeout=15)
+        response = http_client.get(HN_API_URL, params=params)
 
         if response.status_code != 200:
             print(f"HN API error: {response.status_code}")
@@ -361,7 +281,7 @@ def fetch_hacker_news(min_points: int = HN_MIN_POINTS, max_articles: int = 30) -
             source_name = f"HN ({points}pt) via {domain}"
 
             # Boost score for preferred domains
-            is_preferred = any(pref in url.lower() for pref in HN_PREFERRED_DOMAINS)
+            is_preferred = HN_PREFERRED_MATCHER.match(urlparse(url).netloc) is not None
 
             articles.append({
                 "title": title,
@@ -383,11 +303,14 @@ def fetch_hacker_news(min_points: int = HN_MIN_POINTS, max_articles: int = 30) -
 
 
 def fetch_feed(feed_info: dict) -> list:
+    """Fetch the entries a feed has published since our last poll."""
     try:
-        feed = feedparser.parse(feed_info["url"])
+        feed_entries = fetch_entries(feed_info["url"])
+        new_entries = entries_since_watermark(feed_info["url"], feed_entries)
+        schedule_next_poll(feed_info["url"], feed_entries, found_new=bool(new_entries))
         entries = []
 
-        for entry in feed.entries[:10]:
+        for entry in new_entries:
             title = entry.get("title", "Untitled")
             link = fix_known_redirects(entry.get("link", ""))
 
@@ -399,6 +322,8 @@ def fetch_feed(feed_info: dict) -> list:
                 "title": title,
                 "link": link,
                 "source": feed_info["name"],
+                "summary": entry.get("summary", ""),
+                "feed": feed_info["url"],
             })
         
         return entries
@@ -410,33 +335,31 @@ def fetch_feed(feed_info: dict) -> list:
 
 def collect_articles():
     """Collect new articles from all feeds"""
-    seen_raw = load_json(POSTED_FILE, [])
-    seen = {normalize_url(u) for u in seen_raw}
-    training_log = load_json(TRAINING_LOG_FILE, [])
-    reviewed_urls = {normalize_url(item["url"]) for item in training_log}
-
+    seen = set()
     new_articles = []
 
-    shuffled_feeds = FEEDS.copy()
+    # Only poll feeds whose next scheduled check has come
+    shuffled_feeds = due_feeds(FEEDS)
     random.shuffle(shuffled_feeds)
 
-    for feed_info in shuffled_feeds:
-        entries = fetch_feed(feed_info)
-
+    for entries in fetch_all(shuffled_feeds, fetch_feed):
         for entry in entries:
             url = entry["link"]
             normalized = normalize_url(url)
 
             # Skip if already seen or reviewed
-            if normalized in seen or normalized in reviewed_urls:
+            if normalized in seen or state.is_seen(normalized):
                 continue
 
             new_articles.append(entry)
             seen.add(normalized)
-        
-        time.sleep(0.3)
-    
-    save_json(POSTED_FILE, list(seen))
+
+    save_feed_cache()
+    for url in seen:
+        state.add_posted(url)
+    # Every collected entry is now marked seen, so the feeds' watermarks can move on
+    commit_watermarks()
+    save_feed_state()
     return new_articles
 
 
@@ -456,68 +379,107 @@ def send_for_review(article: dict, num: int = 1) -> bool:
 
 Reply: <b>1</b>=👍  <b>0</b>=👎"""
     
-    return send_message(ANDY_CHAT_ID, message)
+    return send_message(ANDY_CHAT_ID, message, key=f"review:{normalize_url(link)}")
+
+
+def parse_ratings(text: str) -> list:
+    """Ratings in a reply like '1,0,1,1,0', '10110' or 'y n' ("good"/"bad", in order)."""
+    clean_text = text.strip().lower().replace(",", "").replace(" ", "").replace("y", "1").replace("n", "0")
+    return ["good" if char == "1" else "bad" for char in clean_text if char in "10"]
+
+
+def apply_training_rating(item: dict, rating: str):
+    """Log Andy's rating of a training article."""
+    item["rating"] = rating
+    state.add_rating(item)
+    remember(item.get("url", ""), item.get("title", ""))
+    print(f"Logged {rating.upper()}: {item.get('title', '')[:40]}...")
+
+
+def read_decisions(batch: list, pending: list) -> tuple:
+    """
+    Andy's decisions in a batch of updates, as ([(item, rating)], [callback query]).
+    A button tap rates its own item, whatever the order; a text reply like
+    "1,0,1" rates the undecided pending items in order. A later decision on
+    the same item replaces an earlier one.
+    """
+    by_id = {item["id"]: item for item in pending if "id" in item}
+    decisions = {}  # id(item) -> (item, rating)
+    callbacks = []
+
+    for update in batch:
+        callback = update.get("callback_query")
+        if callback:
+            if str(callback.get("from", {}).get("id", "")) != ANDY_CHAT_ID:
+                continue
+            callbacks.append(callback)
+            action, _, rest = callback.get("data", "").partition(":")
+            item_id, _, rating = rest.partition(":")
+            item = by_id.get(item_id)
+            if action == "rate" and item is not None and rating in ("good", "bad"):
+                decisions[id(item)] = (item, rating)
+            continue
+
+        message = update.get("message", {})
+        if str(message.get("chat", {}).get("id", "")) != ANDY_CHAT_ID:
+            continue
+        ratings = parse_ratings(message.get("text", ""))
+        undecided = [item for item in pending if id(item) not in decisions]
+        for item, rating in zip(undecided, ratings):
+            decisions[id(item)] = (item, rating)
+
+    return list(decisions.values()), callbacks
+
+
+def handle_updates(batch: list) -> int:
+    """
+    Apply a batch of Andy's replies to the pending articles. Each item goes
+    to the training or the discovered-source review handler depending on
+    which flow sent it; review decisions are applied together. Returns the
+    number of items rated.
+    """
+    pending = state.get_pending()
+    decisions, callbacks = read_decisions(batch, pending)
+
+    reviews = []
+    for item, rating in decisions:
+        if is_review_item(item):
+            reviews.append((item, rating))
+        else:
+            apply_training_rating(item, rating)
+    apply_review_ratings(reviews)
+
+    decided = {id(item): rating for item, rating in decisions}
+    if decided:
+        pending = [item for item in pending if id(item) not in decided]
+        state.save_pending(pending)
+
+    answer_review_buttons(callbacks, decisions, pending)
+    if reviews and not any(is_review_item(item) for item in pending):
+        # That finished the review card - send the next one straight away
+        send_next_review_card(pending)
+    return len(decisions)
 
 
 def process_responses():
     """Check for Andy's responses - handles batch responses like '1,0,1,1,0' or individual '1'/'0'"""
-    training_log = load_json(TRAINING_LOG_FILE, [])
-    pending = load_json(PENDING_REVIEW_FILE, [])
-    
-    if not pending:
+    if not state.get_pending():
         return
-    
-    updates = get_updates()
-    
-    for update in updates:
-        message = update.get("message", {})
-        chat_id = str(message.get("chat", {}).get("id", ""))
-        text = message.get("text", "").strip().lower()
-        
-        if chat_id != ANDY_CHAT_ID:
-            continue
-        
-        # Handle batch response like "1,0,1,1,0" or "10110"
-        ratings = []
-        
-        # Remove any spaces or commas, just get the 1s and 0s
-        clean_text = text.replace(",", "").replace(" ", "").replace("y", "1").replace("n", "0")
-        
-        for char in clean_text:
-            if char == "1":
-                ratings.append("good")
-            elif char == "0":
-                ratings.append("bad")
-        
-        # Apply ratings to pending articles in order
-        if ratings:
-            for i, rating in enumerate(ratings):
-                if i < len(pending):
-                    pending[i]["rating"] = rating
-                    training_log.append(pending[i])
-                    print(f"Logged {rating.upper()}: {pending[i].get('title', '')[:40]}...")
-            
-            # Remove rated articles from pending
-            pending = pending[len(ratings):]
-            save_json(PENDING_REVIEW_FILE, pending)
-    
-    save_json(TRAINING_LOG_FILE, training_log)
-    
-    # Clear processed updates
-    if updates:
-        last_update_id = updates[-1]["update_id"]
-        get_updates(offset=last_update_id + 1)
+
+    updates.consume(handle_updates)
 
 
+@state.in_run_session
 def run_training():
     """Main training loop - sends batch of articles for rapid review"""
     print(f"[{datetime.now()}] Training mode running...")
+    outbox.deliver_pending()
     
     # First, process any responses
     process_responses()
     
     # Load pending reviews
-    pending = load_json(PENDING_REVIEW_FILE, [])
+    pending = state.get_pending()
     
     # Count how many are still awaiting response
     awaiting = len(pending)
@@ -528,11 +490,8 @@ def run_training():
         
         if not articles:
             # Fall back to canonical evergreen essays
-            seen_urls = {normalize_url(u) for u in load_json(POSTED_FILE, [])}
-            reviewed_urls = {normalize_url(item["url"]) for item in load_json(TRAINING_LOG_FILE, [])}
             for canon in CANONICAL_READINGS:
-                canon_normalized = normalize_url(canon["url"])
-                if canon_normalized not in seen_urls and canon_normalized not in reviewed_urls:
+                if not state.is_seen(canon["url"]):
                     articles.append({
                         "title": canon["title"],
                         "link": canon["url"],
@@ -559,89 +518,43 @@ def run_training():
                         "sent_at": datetime.now().isoformat(),
                     })
                     print(f"Sent #{article_num}: {article['title'][:40]}...")
-                    time.sleep(1)  # Small delay between sends
             
-            save_json(PENDING_REVIEW_FILE, pending)
+            state.save_pending(pending)
     else:
         print(f"Waiting for responses on {awaiting} pending articles...")
     
     # Log stats
-    training_log = load_json(TRAINING_LOG_FILE, [])
-    good = len([x for x in training_log if x.get("rating") == "good"])
-    bad = len([x for x in training_log if x.get("rating") == "bad"])
+    counts = state.rating_counts()
+    good = counts["good"]
+    bad = counts["bad"]
     print(f"Training progress: {good} good, {bad} bad, {good + bad} total")
 
 
 # === PRODUCTION MODE ===
 
-# Title patterns that indicate low-quality content
-BAD_TITLE_PATTERNS = [
-    "roundup", "reading list", "classifieds", "open thread",
-    "discussion post", "weekly top", "ainews", "[ainews]",
-    "trade alert", "earnings,", "personal day",
-]
-
-
 def get_source_scores() -> dict:
-    """Calculate trust scores per source from training data."""
-    training_log = load_json(TRAINING_LOG_FILE, [])
-    source_stats = {}
-
-    for item in training_log:
-        source = item.get("source", "Unknown")
-        rating = item.get("rating", "")
+    """Trust scores per source (good ratio) from the per-source rating counters."""
+    # Unknown sources aren't in here - score_article treats them as neutral (0.5)
+    return state.source_trust_scores()
 
-        if source not in source_stats:
-            source_stats[source] = {"good": 0, "bad": 0}
-
-        if rating == "good":
-            source_stats[source]["good"] += 1
-        elif rating == "bad":
-            source_stats[source]["bad"] += 1
-
-    # Calculate scores (good ratio)
-    scores = {}
-    for source, stats in source_stats.items():
-        total = stats["good"] + stats["bad"]
-        if total > 0:
-            scores[source] = stats["good"] / total
-        else:
-            scores[source] = 0.5  # Neutral for unknown
 
-    return scores
+def post_key(link: str) -> str:
+    """Outbox idempotency key of a channel post."""
+    return f"post:{normalize_url(link)}"
 
 
-def score_article(article: dict, source_scores: dict) -> float:
-    """Score an article based on source reputation and title patterns."""
-    title = article.get("title", "").lower()
-    source = article.get("source", "")
+def is_post_rejected(link: str) -> bool:
+    """Telegram refused this post for good (e.g. a 400 for bad markup) - retrying won't help."""
+    return outbox.get_outbox().status(post_key(link)) == "rejected"
 
-    # Start with source score (or 0.5 if unknown)
-    score = source_scores.get(source, 0.5)
 
-    # Penalize bad title patterns
-    for pattern in BAD_TITLE_PATTERNS:
-        if pattern in title:
-            score -= 0.3
-            break
-
-    # Bonus for Hacker News articles based on points
-    hn_points = article.get("hn_points", 0)
-    if hn_points > 0:
-        # Base bonus for being on HN with high points
-        if hn_points >= 500:
-            score += 0.3
-        elif hn_points >= 300:
-            score += 0.2
-        elif hn_points >= 150:
-            score += 0.1
-
-        # Extra bonus for preferred essay domains
-        if article.get("hn_preferred", False):
-            score += 0.15
-
-    # Clamp to 0-1
-    return max(0.0, min(1.0, score))
+def cancel_post(link: str):
+    """
+    Take back a post that didn't go out (e.g. a long retry_after) when its
+    article goes back to the queue, so a later deliver_pending() can't send
+    it without it being recorded as posted. It's queued afresh when picked again.
+    """
+    outbox.get_outbox().cancel(post_key(link))
 
 
 def post_to_channel(article: dict) -> bool:
@@ -656,41 +569,38 @@ def post_to_channel(article: dict) -> bool:
 
 <i>— {source}</i>"""
 
-    return send_message(TELEGRAM_CHANNEL_ID, message)
+    return send_message(TELEGRAM_CHANNEL_ID, message, key=post_key(link))
 
 
 def collect_articles_without_saving():
-    """Collect new articles from feeds without saving to posted.json."""
-    seen_raw = load_json(POSTED_FILE, [])
-    seen = {normalize_url(u) for u in seen_raw}
-    training_log = load_json(TRAINING_LOG_FILE, [])
-    reviewed_urls = {normalize_url(item["url"]) for item in training_log}
-
+    """
+    Collect new articles from feeds without marking them as posted. The
+    caller commits the feeds' watermarks once it has dealt with them.
+    """
     new_articles = []
 
-    shuffled_feeds = FEEDS.copy()
+    # Only poll feeds whose next scheduled check has come
+    shuffled_feeds = due_feeds(FEEDS)
     random.shuffle(shuffled_feeds)
 
-    for feed_info in shuffled_feeds:
-        entries = fetch_feed(feed_info)
-
+    for entries in fetch_all(shuffled_feeds, fetch_feed):
         for entry in entries:
             url = entry["link"]
-            normalized = normalize_url(url)
-
-            if normalized in seen or normalized in reviewed_urls:
+            if state.is_seen(url):
                 continue
 
             new_articles.append(entry)
 
-        time.sleep(0.3)
-
+    save_feed_cache()
+    save_feed_state()
     return new_articles
 
 
+@state.in_run_session
 def run_production():
     """Production mode - auto-curate and post to channel."""
     print(f"[{datetime.now()}] Production mode running...")
+    outbox.deliver_pending()
 
     # Get source scores from training data
     source_scores = get_source_scores()
@@ -701,14 +611,8 @@ def run_production():
 
     if not articles:
         # Fall back to canonical essays
-        seen_urls = {normalize_url(u) for u in load_json(POSTED_FILE, [])}
-        training_log = load_json(TRAINING_LOG_FILE, [])
-        reviewed_urls = {normalize_url(item["url"]) for item in training_log}
-        good_urls = {normalize_url(item["url"]) for item in training_log if item.get("rating") == "good"}
-
         for canon in CANONICAL_READINGS:
-            canon_normalized = normalize_url(canon["url"])
-            if canon_normalized in good_urls or (canon_normalized not in seen_urls and canon_normalized not in reviewed_urls):
+            if state.is_rated_good(canon["url"]) or not state.is_seen(canon["url"]):
                 articles.append({
                     "title": canon["title"],
                     "link": canon["url"],
@@ -720,12 +624,13 @@ def run_production():
 
     if not articles:
         print("No articles to post")
+        commit_watermarks()
+        save_feed_state()
         return
 
     # Score and filter articles
     scored = []
-    for article in articles:
-        score = score_article(article, source_scores)
+    for article, score in zip(articles, score_batch(articles, source_scores, get_model()).tolist()):
         article["score"] = score
         if score >= MIN_SCORE_THRESHOLD:
             scored.append(article)
@@ -737,7 +642,6 @@ def run_production():
 
     # Post top articles (limit to 3 per cycle, max 1 per source)
     posted_count = 0
-    posted_urls = load_json(POSTED_FILE, [])
     posted_sources = set()
 
     for article in scored:
@@ -753,14 +657,20 @@ def run_production():
             print(f"Posted (score {article['score']:.2f}): {article['title'][:40]}...")
             posted_count += 1
             posted_sources.add(source)
-            posted_urls.append(normalize_url(article["link"]))
-            time.sleep(2)
+            state.add_posted(article["link"])
+            remember(article["link"], article["title"], article.get("summary", ""))
+        elif is_post_rejected(article["link"]):
+            print(f"Dropping (rejected by Telegram): {article['title'][:40]}...")
         else:
             print(f"Failed to post: {article['title'][:40]}...")
+            cancel_post(article["link"])
+            break  # The channel isn't taking posts right now - the rest would fail the same way
 
-    # Save successfully posted URLs
-    if posted_count > 0:
-        save_json(POSTED_FILE, posted_urls)
+    # Good articles that didn't get a slot this cycle come back next cycle
+    commit_watermarks(keep={
+        a.get("feed") for a in scored if not state.is_posted(a["link"]) and not is_post_rejected(a["link"])
+    })
+    save_feed_state()
 
     print(f"Posted {posted_count} articles to {TELEGRAM_CHANNEL_ID}")
 
@@ -768,21 +678,25 @@ def run_production():
 # === SCHEDULED POSTING MODE ===
 
 def build_queue():
-    """Build a queue of scored articles ready for scheduled posting."""
+    """
+    Build a queue of scored articles ready for scheduled posting.
+
+    Fetching (feeds, Hacker News, redirect / canonical lookups) happens
+    outside any run session, so a post or a reply batch due mid-crawl
+    isn't held up by it. Only the merge into the queue runs in a session,
+    and it re-reads the queue, so posts made meanwhile aren't undone.
+    """
     print(f"[{datetime.now()}] Building queue...")
 
     # Get source scores
     source_scores = get_source_scores()
 
-    # Load existing queue
-    queue = load_json(QUEUE_FILE, [])
-    queue_urls = {normalize_url(item["link"]) for item in queue}
+    # URLs to skip: already queued (posted/reviewed are looked up in state)
+    skip_urls = {normalize_url(item["link"]) for item in state.get_queue()}
+    skip_urls |= {state.get_alias(url) for url in skip_urls} - {None}
 
-    # Load URLs to skip (already posted or reviewed)
-    posted_urls = {normalize_url(u) for u in load_json(POSTED_FILE, [])}
-    training_log = load_json(TRAINING_LOG_FILE, [])
-    reviewed_urls = {normalize_url(item.get("url", "")) for item in training_log}
-    skip_urls = queue_urls | posted_urls | reviewed_urls
+    # Fresh allowance of redirect / canonical lookups for this run
+    reset_budget()
 
     # Collect new articles from RSS feeds
     articles = collect_articles_without_saving()
@@ -791,135 +705,179 @@ def build_queue():
     hn_articles = fetch_hacker_news()
     for hn_article in hn_articles:
         normalized = normalize_url(hn_article["link"])
-        if normalized not in skip_urls:
+        if normalized not in skip_urls and not state.is_seen(normalized):
             articles.append(hn_article)
 
     # Add canonical essays if needed
     if len(articles) < 20:
         for canon in CANONICAL_READINGS:
             canon_normalized = normalize_url(canon["url"])
-            if canon_normalized not in skip_urls:
+            if canon_normalized not in skip_urls and not state.is_seen(canon_normalized):
                 articles.append({
                     "title": canon["title"],
                     "link": canon["url"],
                     "source": canon.get("author", "Canonical"),
                 })
 
-    # Track source counts for diversity (max 2 per source in queue)
-    MAX_PER_SOURCE = 2
-    source_counts = {}
-    for item in queue:
-        src = item.get("source", "")
-        source_counts[src] = source_counts.get(src, 0) + 1
+    scores = score_batch(articles, source_scores, get_model()).tolist()
+
+    # Same essay under another URL (redirect / rel=canonical)? Looked up now, while no session is open
+    canonicals = {}
+    for article, score in zip(articles, scores):
+        link = article.get("link", "")
+        if score < MIN_SCORE_THRESHOLD or normalize_url(link) in skip_urls or state.is_seen(link):
+            continue
+        if is_source_paused(article.get("source", ""), link) or is_source_rejected(article.get("source", ""), link):
+            continue
+        canonicals[link] = resolve_canonical(link)
+
+    with state.run_session():
+        return merge_into_queue(articles, scores, canonicals)
+
+
+def merge_into_queue(articles: list, scores: list, canonicals: dict) -> int:
+    """Add scored articles to the current queue and commit the feeds' watermarks. Returns the queue size."""
+    queue = state.get_queue()
+    skip_urls = {normalize_url(item["link"]) for item in queue}
+    skip_urls |= {state.get_alias(url) for url in skip_urls} - {None}
+
+    # Same story under a different title/URL (e.g. RSS + Hacker News)?
+    queued_stories = NearDupIndex(queue)
+
+    # Queue ranked by score plus resemblance to articles rated good / canonical essays,
+    # decayed by age, with a per-source cap (see post_queue.py)
+    unranked = [item for item in queue if "similarity" not in item]
+    for item, similarity in zip(unranked, get_index().similarity(unranked).tolist()):
+        item["similarity"] = similarity
+    queue = PostQueue(queue)
 
     # Score and filter new articles
-    for article in articles:
+    similarities = get_index().similarity(articles).tolist()
+    waiting = set()  # Feeds with good entries that couldn't be queued yet
+    for article, score, similarity in zip(articles, scores, similarities):
         normalized = normalize_url(article["link"])
-        if normalized in skip_urls:
+        if normalized in skip_urls or state.is_seen(normalized):
             continue
 
-        # Limit articles per source for diversity
         source = article.get("source", "")
         link = article.get("link", "")
 
-        # Skip paused sources
+        # Skip paused sources (for now - their entries come back once the pause ends)
         if is_source_paused(source, link):
+            waiting.add(article.get("feed"))
             continue
 
         # Skip rejected sources
         if is_source_rejected(source, link):
             continue
 
-        if source_counts.get(source, 0) >= MAX_PER_SOURCE:
-            continue
-
-        score = score_article(article, source_scores)
         if score >= MIN_SCORE_THRESHOLD:
             article["score"] = score
-            queue.append(article)
-            skip_urls.add(normalized)
-            source_counts[source] = source_counts.get(source, 0) + 1
-            print(f"Queued (score {score:.2f}): {article['title'][:40]}...")
+            article["similarity"] = similarity
 
-    # Sort queue by score
-    queue.sort(key=lambda x: x.get("score", 0), reverse=True)
+            # Source already has its share of the queue, or the queue is full of better articles
+            if not queue.can_push(article):
+                waiting.add(article.get("feed"))
+                continue
+
+            title = article.get("title", "")
+            summary = article.get("summary", "")
+            duplicate = queued_stories.find(title, summary) or find_near_duplicate(title, summary)
+            if duplicate:
+                print(f"Near-duplicate of {duplicate}: {title[:40]}...")
+                continue
+
+            # Same essay already seen under another URL (redirect / rel=canonical)?
+            canonical = canonicals.get(link) or resolve_canonical(link)
+            if canonical in skip_urls or state.is_seen(canonical):
+                continue
+
+            if queue.push(article):
+                skip_urls.add(normalized)
+                skip_urls.add(canonical)
+                queued_stories.add(link, title, summary)
+                print(f"Queued (score {score:.2f}): {article['title'][:40]}...")
+            else:
+                waiting.add(article.get("feed"))
 
-    # Keep queue manageable (max 50 articles)
-    queue = queue[:50]
+    queue = queue.articles()
 
-    save_json(QUEUE_FILE, queue)
+    state.save_queue(queue)
+    # Feeds with entries that didn't fit keep their watermark, so those entries come back
+    commit_watermarks(keep=waiting)
+    save_feed_state()
     print(f"Queue size: {len(queue)} articles")
     return len(queue)
 
 
-def post_from_queue(count: int = 2):
+@state.in_run_session
+def post_from_queue(count: int = 2, build_if_empty: bool = True):
     """Post articles from the queue (for scheduled posting).
 
     Enforces one article per source per day to ensure variety.
+    With build_if_empty=False it never crawls - the queue is left to the crawl step.
     """
     print(f"[{datetime.now()}] Posting {count} articles from queue...")
 
-    queue = load_json(QUEUE_FILE, [])
+    queue = state.get_queue()
 
-    if not queue:
+    if not queue and build_if_empty:
         print("Queue is empty! Building queue first...")
         build_queue()
-        queue = load_json(QUEUE_FILE, [])
+        queue = state.get_queue()
 
     if not queue:
         print("No articles available to post")
         return 0
 
     posted_count = 0
-    posted_urls = load_json(POSTED_FILE, [])
 
     # Load sources already posted TODAY (resets at midnight Chicago time)
     daily_sources = load_daily_sources()
     print(f"Sources already posted today: {len(daily_sources)}")
 
-    remaining_queue = []
+    queue = PostQueue(queue)
+    failed = []
 
-    for article in queue:
-        if posted_count >= count:
-            remaining_queue.append(article)
-            continue
+    def is_eligible(article):
+        # Paused sources stay queued until their cooldown expires
+        return not is_source_paused(article.get("source", ""), article.get("link", ""))
+
+    while posted_count < count:
+        # Best article from a source that hasn't posted today and isn't paused
+        article = queue.pop(skip_sources=daily_sources, is_eligible=is_eligible)
+        if article is None:
+            break
 
         source = article.get("source", "")
-        link = article.get("link", "")
-        normalized_link = normalize_url(link)
 
         # Skip if already posted (prevent duplicates)
-        if normalized_link in {normalize_url(u) for u in posted_urls}:
+        if state.is_posted(article["link"]):
             print(f"Skipping (already posted): {article['title'][:40]}...")
             continue  # Don't add back to queue - it's already posted
 
-        # Skip if source is temporarily paused
-        if is_source_paused(source, link):
-            print(f"Skipping (paused until cooldown expires): {source}")
-            remaining_queue.append(article)
-            continue
-
-        # Skip if this source already posted today
-        if source in daily_sources:
-            print(f"Skipping (already posted today): {source}")
-            remaining_queue.append(article)
-            continue
-
         if post_to_channel(article):
             print(f"Posted: {article['title'][:50]}...")
             posted_count += 1
             daily_sources.add(source)
-            save_daily_source(source)  # Persist immediately
-            posted_urls.append(normalize_url(article["link"]))
-            time.sleep(2)
+            save_daily_source(source)
+            state.add_posted(article["link"])
+            remember(article["link"], article["title"], article.get("summary", ""))
+        elif is_post_rejected(article["link"]):
+            # Pushing it back would fail the same way at every slot
+            print(f"Dropping (rejected by Telegram): {article['title'][:40]}...")
         else:
             print(f"Failed to post: {article['title'][:40]}...")
-            remaining_queue.append(article)
+            cancel_post(article["link"])
+            failed.append(article)
+            break  # The channel isn't taking posts right now - the rest would fail the same way
+
+    for article in failed:
+        queue.push(article, force=True)
 
     # Save state
-    if posted_count > 0:
-        save_json(POSTED_FILE, posted_urls)
-    save_json(QUEUE_FILE, remaining_queue)
+    remaining_queue = queue.articles()
+    state.save_queue(remaining_queue)
 
     print(f"Posted {posted_count} articles. Queue remaining: {len(remaining_queue)}")
     return posted_count
@@ -927,118 +885,191 @@ def post_from_queue(count: int = 2):
 
 # === REVIEW MODE (Human-in-the-loop) ===
 
-def send_for_channel_review(article: dict, num: int = 1) -> bool:
-    """Send an article to Andy for review before posting to channel."""
-    title = article["title"]
-    link = article["link"]
-    source = article["source"]
-    score = article.get("score", 0)
+def review_item_id(url: str) -> str:
+    """Short stable id for a review item (button callback data is limited to 64 bytes)."""
+    return format(url_hash(normalize_url(url)), "016x")[:12]
 
-    message = f"""🔍 <b>Review #{num}</b>
 
-<b>{title}</b>
+def review_keyboard(items: list) -> dict:
+    """One ✅/❌ button pair per undecided item on a review card."""
+    return {"inline_keyboard": [
+        [
+            {"text": f"✅ {item['num']}", "callback_data": f"rate:{item['id']}:good"},
+            {"text": f"❌ {item['num']}", "callback_data": f"rate:{item['id']}:bad"},
+        ]
+        for item in items
+    ]}
+
 
+def send_review_card(articles: list) -> list:
+    """
+    Send several discovered-source articles to Andy as one message, with a
+    button pair per article. Returns their pending items ([] if sending failed).
+    """
+    items = []
+    lines = [f"🔍 <b>Review: {len(articles)} new sources</b>"]
+    for num, article in enumerate(articles, 1):
+        link = article["link"]
+        items.append({
+            "kind": "review",
+            "id": review_item_id(link),
+            "num": num,
+            "title": article["title"],
+            "url": link,
+            "source": article["source"],
+            "domain": article.get("domain", ""),
+            "feed_url": article.get("feed_url", ""),
+            "score": 0,
+            "sent_at": datetime.now().isoformat(),
+        })
+        lines.append(f"""
+<b>{num}. {html.escape(article['title'])}</b>
 {link}
+<i>— {html.escape(article['source'])}</i>""")
+    lines.append("\n✅ = post it and add the source to feeds, ❌ = skip and block the source")
+
+    card = f"review-card:{items[0]['id']}:{len(items)}"
+    for item in items:
+        item["card"] = card
+
+    if not send_message(ANDY_CHAT_ID, "\n".join(lines), key=card, reply_markup=review_keyboard(items), preview=False):
+        return []
+    return items
+
+
+def send_next_review_card(pending: list) -> bool:
+    """Send the next REVIEW_CARD_SIZE review candidates as one card, if there are any."""
+    candidates = [
+        a for a in state.get_review_candidates()
+        if not state.is_seen(a["link"]) and not is_source_rejected(a["source"], a["link"])
+    ]
+    if not candidates:
+        state.save_review_candidates(candidates)
+        print("No new discovered sources to review")
+        return False
+
+    card, candidates = candidates[:REVIEW_CARD_SIZE], candidates[REVIEW_CARD_SIZE:]
+    items = send_review_card(card)
+    if not items:
+        candidates = card + candidates  # Try again next run
+    state.save_review_candidates(candidates)
+    if items:
+        state.save_pending(pending + items)
+        print(f"Sent review card: {len(items)} new sources ({len(candidates)} more waiting)")
+    return bool(items)
+
+
+def answer_review_buttons(callbacks: list, decisions: list, pending: list):
+    """
+    Acknowledge button taps and take decided items' buttons off their cards
+    (one edit per card, however many of its items were decided).
+    """
+    decided = {item.get("id"): (item, rating) for item, rating in decisions}
+    cards = {}  # card -> (chat id, message id)
+    for callback in callbacks:
+        item_id = callback.get("data", "").split(":")[1:2]
+        item, rating = decided.get(item_id[0] if item_id else None, (None, None))
+        text = {"good": "✅ Approved", "bad": "❌ Rejected"}.get(rating, "Already decided")
+        try:
+            telegram_api.call("answerCallbackQuery", {"callback_query_id": callback["id"], "text": text})
+        except Exception as e:
+            print(f"Error answering button: {e}")
+
+        message = callback.get("message") or {}
+        if item is not None and item.get("card") and message.get("message_id"):
+            cards[item["card"]] = (message["chat"]["id"], message["message_id"])
+
+    for card, (chat_id, message_id) in cards.items():
+        remaining = [item for item in pending if item.get("card") == card]
+        try:
+            telegram_api.call("editMessageReplyMarkup", {
+                "chat_id": chat_id, "message_id": message_id, "reply_markup": review_keyboard(remaining),
+            })
+        except Exception as e:
+            print(f"Error updating review card: {e}")
 
-<i>— {source}</i>
-<i>Score: {score:.2f}</i>
 
-Reply: <b>1</b>=✅ Post to channel  <b>0</b>=❌ Skip"""
+def is_review_item(item: dict) -> bool:
+    """Was this pending item sent by the discovered-source review (not training)?"""
+    return item.get("kind") == "review" or "feed_url" in item
 
-    return send_message(ANDY_CHAT_ID, message)
+
+def apply_review_ratings(reviews: list):
+    """
+    Apply a batch of (article, rating) review decisions. Approved articles
+    join the queue and their sources go into feeds.py; rejected ones block
+    their source. The queue and feeds.py are each written once per batch.
+    """
+    if not reviews:
+        return
+
+    queue = None
+    new_sources = []
+    for article, rating in reviews:
+        article["rating"] = rating
+        state.add_rating(article)
+        remember(article.get("url", ""), article.get("title", ""))
+
+        if rating == "good":
+            # Ranked with everything else (hand-approved, so no per-source cap)
+            if queue is None:
+                queue = PostQueue(state.get_queue())
+            queue.push({
+                "title": article["title"],
+                "link": article["url"],
+                "source": article["source"],
+                "score": 0.7,
+                "approved": True,
+            }, force=True)
+
+            # Source becomes a trusted feed
+            if article.get("feed_url"):
+                new_sources.append({
+                    "name": article["source"],
+                    "url": article["feed_url"],
+                    "domain": article.get("domain", ""),
+                })
+            print(f"APPROVED: {article['title'][:40]}... (added to queue, source added to feeds)")
+        else:
+            # Reject article AND block the source
+            add_rejected_source(article["source"], article.get("url", ""))
+            print(f"REJECTED (source blocked): {article['title'][:40]}...")
+
+    if queue is not None:
+        state.save_queue(queue.articles())
+    if new_sources:
+        add_sources_to_feeds(new_sources)
 
 
 def process_review_responses():
     """Process Andy's responses to review requests."""
-    pending = load_json(PENDING_REVIEW_FILE, [])
-    approved = load_json(APPROVED_FILE, [])
-    training_log = load_json(TRAINING_LOG_FILE, [])
-
-    if not pending:
+    if not state.get_pending():
         return 0
 
-    updates = get_updates()
     processed = 0
 
-    for update in updates:
-        message = update.get("message", {})
-        chat_id = str(message.get("chat", {}).get("id", ""))
-        text = message.get("text", "").strip().lower()
+    def handle(batch):
+        nonlocal processed
+        processed += handle_updates(batch)
 
-        if chat_id != ANDY_CHAT_ID:
-            continue
+    updates.consume(handle)
+    return processed
 
-        # Parse ratings (1s and 0s)
-        ratings = []
-        clean_text = text.replace(",", "").replace(" ", "").replace("y", "1").replace("n", "0")
-
-        for char in clean_text:
-            if char == "1":
-                ratings.append("good")
-            elif char == "0":
-                ratings.append("bad")
-
-        # Apply ratings
-        if ratings:
-            for i, rating in enumerate(ratings):
-                if i < len(pending):
-                    article = pending[i]
-                    article["rating"] = rating
-                    training_log.append(article)
-
-                    if rating == "good":
-                        # Add article to queue (will be posted in normal rotation)
-                        queue = load_json(QUEUE_FILE, [])
-                        new_article = {
-                            "title": article["title"],
-                            "link": article["url"],
-                            "source": article["source"],
-                            "score": 0.7,
-                        }
-                        # Insert at random position (not front, not last)
-                        if len(queue) > 2:
-                            insert_pos = random.randint(1, len(queue) - 1)
-                            queue.insert(insert_pos, new_article)
-                        else:
-                            queue.append(new_article)
-                        save_json(QUEUE_FILE, queue)
-
-                        # Add source to feeds.py (now a trusted source)
-                        if article.get("feed_url"):
-                            add_source_to_feeds(
-                                name=article["source"],
-                                url=article["feed_url"],
-                                domain=article.get("domain", "")
-                            )
-
-                        print(f"APPROVED: {article['title'][:40]}... (added to queue, source added to feeds)")
-                    else:
-                        # Reject article AND block the source
-                        add_rejected_source(article["source"], article.get("url", ""))
-                        print(f"REJECTED (source blocked): {article['title'][:40]}...")
-
-                    processed += 1
-
-            # Remove processed from pending
-            pending = pending[len(ratings):]
 
-    # Save state
-    save_json(PENDING_REVIEW_FILE, pending)
-    save_json(APPROVED_FILE, approved)
-    save_json(TRAINING_LOG_FILE, training_log)
+def poll_updates(timeout: int = updates.LONG_POLL_TIMEOUT):
+    """One long poll for Andy's replies (a scheduled-mode job)."""
+    updates.poll(handle_updates, timeout)
 
-    # Clear processed updates
-    if updates:
-        last_update_id = updates[-1]["update_id"]
-        get_updates(offset=last_update_id + 1)
 
-    return processed
+def listen_for_updates():
+    """Apply Andy's replies as they arrive (long polling, runs until stopped)."""
+    print(f"[{datetime.now()}] Listening for replies...")
+    updates.run_forever(handle_updates)
 
 
 def post_approved_to_channel(count: int = 1):
     """Post approved articles to the channel."""
-    approved = load_json(APPROVED_FILE, [])
-    posted_urls = load_json(POSTED_FILE, [])
+    approved = state.get_approved()
     daily_sources = load_daily_sources()
 
     if not approved:
@@ -1047,9 +1078,10 @@ def post_approved_to_channel(count: int = 1):
 
     posted_count = 0
     remaining = []
+    channel_down = False
 
     for article in approved:
-        if posted_count >= count:
+        if posted_count >= count or channel_down:
             remaining.append(article)
             continue
 
@@ -1079,25 +1111,64 @@ def post_approved_to_channel(count: int = 1):
             posted_count += 1
             daily_sources.add(source)
             save_daily_source(source)
-            posted_urls.append(normalize_url(link))
-            time.sleep(2)
+            state.add_posted(link)
+            remember(link, article["title"], article.get("summary", ""))
+        elif is_post_rejected(link):
+            print(f"Dropping (rejected by Telegram): {article['title'][:40]}...")
         else:
             print(f"Failed to post: {article['title'][:40]}...")
+            cancel_post(link)
             remaining.append(article)
+            channel_down = True  # The rest would fail the same way - they wait for the next run
 
     # Save state
-    if posted_count > 0:
-        save_json(POSTED_FILE, posted_urls)
-    save_json(APPROVED_FILE, remaining)
+    state.save_approved(remaining)
 
     print(f"Posted {posted_count} approved articles to channel")
     return posted_count
 
 
+def fetch_discovered_feed(source: dict) -> list:
+    """Fetch the top entries from a single discovered source."""
+    domain = source.get("domain", "")
+    feed_url = source["url"]
+    articles = []
+
+    try:
+        if is_due(feed_url):
+            previous_ids = {e["id"] for e in cached_entries(feed_url)}
+            feed_entries = fetch_entries(feed_url)
+            found_new = any(e["id"] not in previous_ids for e in feed_entries)
+            schedule_next_poll(feed_url, feed_entries, found_new=found_new)
+        else:
+            # Not due yet - reuse what we fetched last time
+            feed_entries = cached_entries(feed_url)
+
+        for entry in feed_entries[:3]:  # Just top 3 per source
+            title = entry.get("title", "Untitled")
+            link = entry.get("link", "")
+
+            if not link or is_blocked(link, title):
+                continue
+
+            articles.append({
+                "title": title,
+                "link": link,
+                "source": source.get("name", domain),
+                "summary": entry.get("summary", ""),
+                "domain": domain,
+                "feed_url": feed_url,
+                "is_discovered": True,
+            })
+    except Exception as e:
+        print(f"Error fetching {domain}: {e}")
+
+    return articles
+
+
 def fetch_from_discovered_sources():
     """Fetch articles from discovered sources (not yet in feeds.py)."""
-    discovered_file = DATA_DIR / "discovered_sources.json"
-    discovered = load_json(discovered_file, {"sources": []})
+    discovered = state.load_discovered()
 
     # Get domains already in feeds.py
     existing_domains = set()
@@ -1105,17 +1176,13 @@ def fetch_from_discovered_sources():
         domain = urlparse(feed["url"]).netloc.replace("www.", "").lower()
         existing_domains.add(domain)
 
-    # Get rejected domains
-    rejected = load_json(REJECTED_SOURCES_FILE, {"sources": [], "domains": []})
-    rejected_domains = set(rejected.get("domains", []))
-
-    articles = []
+    to_fetch = []
     for source in discovered.get("sources", []):
         domain = source.get("domain", "")
         feed_url = source.get("url")
 
         # Skip if already in feeds.py or rejected
-        if domain in existing_domains or domain in rejected_domains:
+        if domain in existing_domains or is_source_rejected("", f"https://{domain}"):
             continue
 
         # Skip if no valid feed URL
@@ -1123,43 +1190,61 @@ def fetch_from_discovered_sources():
             continue
 
         # Skip corporate/news domains
-        if any(blocked in domain for blocked in BLOCKED_DOMAINS):
+        if SOURCE_POLICY.is_blocked_domain(domain):
             continue
 
-        # Try to fetch the feed
-        try:
-            feed = feedparser.parse(feed_url)
-            for entry in feed.entries[:3]:  # Just top 3 per source
-                title = entry.get("title", "Untitled")
-                link = entry.get("link", "")
+        to_fetch.append(source)
 
-                if not link or is_blocked(link, title):
-                    continue
+    articles = []
+    for entries in fetch_all(to_fetch, fetch_discovered_feed):
+        articles.extend(entries)
+    save_feed_cache()
+    save_feed_state()
 
-                articles.append({
-                    "title": title,
-                    "link": link,
-                    "source": source.get("name", domain),
-                    "domain": domain,
-                    "feed_url": feed_url,
-                    "is_discovered": True,
-                })
-        except Exception as e:
-            print(f"Error fetching {domain}: {e}")
+    return articles
 
-        time.sleep(0.3)
 
-    return articles
+REVIEW_CANDIDATES_KEPT = 300  # Discovered-source articles (one per source) kept ready for review
+REVIEW_CARD_SIZE = 5  # Articles per review card (one button pair each)
 
 
-def run_review_mode():
+def run_crawl():
     """
-    Review mode workflow:
+    Crawl step: fetch feeds and refresh the stores the posting step reads.
+    1. Rebuild the posting queue from RSS feeds, Hacker News and canonical essays
+    2. Refresh the articles from discovered sources waiting to be sent for review
+    3. Print the blocklist rules that matched most this run
+    Feeds are fetched outside the run sessions (see build_queue).
+    """
+    print(f"[{datetime.now()}] Crawling...")
+
+    build_queue()
+
+    # Articles from DISCOVERED sources only, truly new
+    # A review decides the whole source, so one article per source is enough
+    discovered_articles = fetch_from_discovered_sources()
+    with state.run_session():
+        reviewing = {item["source"] for item in state.get_pending() if is_review_item(item)}
+        candidates = []
+        for article in discovered_articles:
+            if article["source"] not in reviewing and not state.is_seen(article["link"]):
+                candidates.append(article)
+                reviewing.add(article["source"])
+        state.save_review_candidates(candidates[:REVIEW_CANDIDATES_KEPT])
+    print(f"Review candidates: {min(len(candidates), REVIEW_CANDIDATES_KEPT)}")
+    print(blocklist_report())
+
+
+@state.in_run_session
+def run_post():
+    """
+    Posting step - no feed fetching, so it takes about as long as the Telegram calls:
     1. Process any responses from Andy (approve/reject discovered sources)
-    2. Post from regular queue (existing feeds - no review needed)
-    3. Send NEW discovered sources for review
+    2. Post from the queue the crawl step built (existing feeds - no review needed)
+    3. Send a card of discovered-source articles for review (only if none is waiting)
     """
-    print(f"[{datetime.now()}] Review mode running...")
+    print(f"[{datetime.now()}] Posting...")
+    outbox.deliver_pending()
 
     # Step 1: Process Andy's responses to discovered source reviews
     processed = process_review_responses()
@@ -1167,51 +1252,26 @@ def run_review_mode():
         print(f"Processed {processed} review responses")
 
     # Step 2: Post from regular queue (existing feeds - these are pre-approved)
-    build_queue()
-    posted = post_from_queue(count=1)
-
-    # Step 3: Send ONE discovered source for review (only if nothing pending)
-    pending = load_json(PENDING_REVIEW_FILE, [])
-
-    # Only send a new article if there's nothing waiting for review
-    if len(pending) == 0:
-        # Fetch articles from DISCOVERED sources only
-        discovered_articles = fetch_from_discovered_sources()
-
-        # Get URLs to skip
-        posted_urls = {normalize_url(u) for u in load_json(POSTED_FILE, [])}
-        training_log = load_json(TRAINING_LOG_FILE, [])
-        reviewed_urls = {normalize_url(item.get("url", "")) for item in training_log}
-        skip_urls = posted_urls | reviewed_urls
-
-        # Filter to truly new articles from discovered sources
-        candidates = [a for a in discovered_articles if normalize_url(a["link"]) not in skip_urls]
-
-        if candidates:
-            # Send just ONE article for review
-            article = candidates[0]
-
-            if send_for_channel_review(article, 1):
-                pending.append({
-                    "title": article["title"],
-                    "url": article["link"],
-                    "source": article["source"],
-                    "domain": article.get("domain", ""),
-                    "feed_url": article.get("feed_url", ""),
-                    "score": 0,
-                    "sent_at": datetime.now().isoformat(),
-                })
-                save_json(PENDING_REVIEW_FILE, pending)
-                print(f"Sent for review: {article['title'][:40]}... (NEW SOURCE: {article['source']})")
-        else:
-            print("No new discovered sources to review")
+    post_from_queue(count=1, build_if_empty=False)
 
+    # Step 3: Send a card of discovered sources for review (only if none is waiting)
+    pending = state.get_pending()
+    if not any(is_review_item(item) for item in pending):
+        if send_next_review_card(pending):
+            pending = state.get_pending()
     else:
-        print(f"Waiting for your review - respond 1 (approve) or 0 (reject)")
+        print(f"Waiting for your review - tap ✅ or ❌ on the review card")
 
     # Stats
     print(f"Status: {len(pending)} pending review")
 
 
+def run_review_mode():
+    """Review mode workflow: crawl, then post (see run_crawl and run_post)."""
+    print(f"[{datetime.now()}] Review mode running...")
+    run_crawl()
+    run_post()
+
+
 if __name__ == "__main__":
     run_training()
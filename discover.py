@@ -6,8 +6,6 @@ Discovers new sources through:
 2. Hacker News Domain Mining - tracks domains that frequently appear in high-scoring posts
 """
 
-import requests
-import json
 import re
 import os
 from pathlib import Path
@@ -15,13 +13,18 @@ from urllib.parse import urlparse
 from datetime import datetime
 from bs4 import BeautifulSoup
 
+import http_client
+import outbox
+import state
+from feed_cache import fetch_entries, is_cached, save_feed_cache
+from feed_state import save_feed_state
+
 # Telegram config
 TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
 ANDY_CHAT_ID = "1023849161"  # Send discoveries to Andy for review
 
 # Files
-DATA_DIR = Path(__file__).parent
-DISCOVERED_FILE = DATA_DIR / "discovered_sources.json"
+DATA_DIR = Path(os.environ.get("BRAIN_CANDY_DATA_DIR") or Path(__file__).parent)
 FEEDS_FILE = DATA_DIR / "feeds.py"
 
 # Hacker News API
@@ -61,18 +64,14 @@ IGNORE_DOMAINS = {
 
 
 def load_discovered():
-    """Load discovered sources from file."""
-    if DISCOVERED_FILE.exists():
-        with open(DISCOVERED_FILE, "r") as f:
-            return json.load(f)
-    return {"sources": [], "seen_domains": [], "last_updated": None}
+    """Load discovered sources from the state store."""
+    return state.load_discovered()
 
 
 def save_discovered(data):
-    """Save discovered sources to file."""
+    """Save discovered sources to the state store."""
     data["last_updated"] = datetime.now().isoformat()
-    with open(DISCOVERED_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    state.save_discovered(data)
 
 
 def get_existing_domains():
@@ -113,7 +112,7 @@ def scrape_substack_recommendations(substack_url: str) -> list:
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
         }
 
-        response = requests.get(rec_url, headers=headers, timeout=10)
+        response = http_client.get(rec_url, headers=headers)
         if response.status_code != 200:
             return []
 
@@ -164,7 +163,7 @@ def mine_hn_domains(min_points: int = 150, num_pages: int = 3) -> dict:
                 "page": page,
             }
 
-            response = requests.get(HN_API_URL, params=params, timeout=15)
+            response = http_client.get(HN_API_URL, params=params)
             if response.status_code != 200:
                 continue
 
@@ -274,8 +273,12 @@ def discover_new_sources():
                 # Common RSS patterns
                 for pattern in ["/feed", "/rss", "/feed.xml", "/rss.xml", "/atom.xml"]:
                     test_url = f"https://{domain}{pattern}"
+                    # Already fetched this feed before - no need to probe
+                    if is_cached(test_url):
+                        feed_url = test_url
+                        break
                     try:
-                        r = requests.head(test_url, timeout=5, allow_redirects=True)
+                        r = http_client.head(test_url, allow_redirects=True)
                         if r.status_code == 200:
                             feed_url = test_url
                             break
@@ -372,19 +375,9 @@ def send_telegram_message(text: str) -> bool:
         print("No Telegram token configured")
         return False
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": ANDY_CHAT_ID,
-        "text": text,
-        "parse_mode": "HTML",
-    }
-
-    try:
-        response = requests.post(url, json=payload, timeout=10)
-        return response.status_code == 200
-    except Exception as e:
-        print(f"Error sending Telegram message: {e}")
-        return False
+    # One report per day: a re-run after a crash doesn't send it twice
+    key = f"discovery-report:{datetime.now().strftime('%Y-%m-%d')}"
+    return outbox.send(ANDY_CHAT_ID, {"text": text, "parse_mode": "HTML"}, key)
 
 
 def auto_add_top_sources(n: int = 5) -> list:
@@ -409,12 +402,9 @@ def auto_add_top_sources(n: int = 5) -> list:
         if not url or domain in existing_domains:
             continue
 
-        # Verify the feed works
+        # Verify the feed works (conditional GET - unchanged feeds aren't re-parsed)
         try:
-            response = requests.get(url, timeout=10)
-            if response.status_code != 200:
-                continue
-            if "xml" not in response.headers.get("content-type", "").lower() and "<rss" not in response.text[:500] and "<feed" not in response.text[:500]:
+            if not fetch_entries(url):
                 continue
         except:
             continue
@@ -452,6 +442,8 @@ def auto_add_top_sources(n: int = 5) -> list:
         except Exception as e:
             print(f"Error adding {domain}: {e}")
 
+    save_feed_cache()
+    save_feed_state()
     return added
 
 
@@ -0,0 +1,518 @@
+"""
+Local stand-in for the Telegram Bot API, for Brain Candy Bot
+
+Serves the part of the Bot API the bot uses (sendMessage, getUpdates,
+answerCallbackQuery, editMessageReplyMarkup) on localhost, so the Telegram
+side of the posting, review and training flows can be run and timed
+offline. Point the bot at it with TELEGRAM_API_BASE, and at a scratch copy
+of its state with BRAIN_CANDY_DATA_DIR - otherwise the run reads and
+writes the real state, and the URLs it "posts" are marked posted for good:
+
+    python fake_telegram.py                      # serve on 127.0.0.1:8081
+    cp -r . /tmp/bot-copy
+    BRAIN_CANDY_DATA_DIR=/tmp/bot-copy TELEGRAM_API_BASE=http://127.0.0.1:8081 \
+        python main.py --github-actions
+
+Lines typed into the server become Andy's replies ("1,0,1"), and
+"/press <message_id> <callback data>" taps a button on a review card.
+
+From Python, everything sent is recorded and faults can be injected:
+
+    with FakeTelegram() as telegram:
+        telegram_api.TELEGRAM_API_URL = telegram.base_url
+        telegram.fail("sendMessage", 429, retry_after=1)
+        telegram.fail("sendMessage", 502, times=2)
+        telegram.reply("1,0")
+        telegram.press(message_id, "rate:<id>:good")
+        telegram.sent_messages(chat_id)
+
+`python fake_telegram.py --benchmark` times the outbox and getUpdates
+long polling against it with 429s and 5xx answers injected.
+
+`python fake_telegram.py --e2e` runs the review, posting and training
+flows end to end against it: on a copy of the bot state in a temporary
+directory, with every feed served offline, so nothing real is touched.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlparse
+
+DEFAULT_PORT = 8081
+DEFAULT_CHAT_ID = "1023849161"  # Andy (bot.ANDY_CHAT_ID)
+
+# Bot state copied for --e2e. Feed caches aren't: every feed is fetched (offline) once.
+# Nor is state_meta.json - the real getUpdates offset is past every update id the fake hands out
+E2E_STATE_FILES = (
+    "feeds.py", "title_model.npz",
+    "posted.json", "posted.jsonl", "training_log.json", "training_log.jsonl", "fingerprints.json", "fingerprints.jsonl",
+    "queue.json", "pending_review.json", "approved.json", "review_candidates.json",
+    "daily_sources.json", "rejected_sources.json", "discovered_sources.json", "url_aliases.json",
+)
+OFFLINE_FEED_ITEMS = 3  # Articles in each offline feed
+OFFLINE_WORDS = (
+    "attention", "markets", "cities", "history", "learning", "science", "writing", "startups",
+    "energy", "memory", "language", "trust", "games", "biology", "design", "progress",
+)
+BOT_ID = 1
+
+
+class FakeTelegram:
+    """In-memory Bot API served over HTTP on a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.latency = latency  # Seconds added to every call (simulated round trip)
+        self.calls = []  # (method, payload, status) for every call, in order
+        self.messages = {}  # message_id -> {"chat_id", "text", "reply_markup", "sent_at"}
+        self.callback_answers = {}  # callback_query_id -> answerCallbackQuery payload
+        self._updates = []  # Updates not yet confirmed by a getUpdates offset
+        self._faults = []  # [method, status, retry_after, times left]
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._polling = 0  # getUpdates calls waiting right now
+        self._cond = threading.Condition()
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeTelegram":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- Injecting replies and faults ---
+
+    def fail(self, method: str, status: int, times: int = 1, retry_after: int = 1):
+        """Answer the next `times` calls to method with an error (429 carries retry_after)."""
+        with self._cond:
+            self._faults.append([method, status, retry_after, times])
+
+    def _add_update(self, update: dict) -> int:
+        with self._cond:
+            update["update_id"] = self._next_update_id
+            self._next_update_id += 1
+            self._updates.append(update)
+            self._cond.notify_all()
+            return update["update_id"]
+
+    def reply(self, text: str, chat_id: str = DEFAULT_CHAT_ID) -> int:
+        """Andy sends the bot a text message. Returns its update_id."""
+        return self._add_update({"message": {
+            "message_id": self._take_message_id(),
+            "from": {"id": int(chat_id), "is_bot": False},
+            "chat": {"id": int(chat_id), "type": "private"},
+            "date": int(time.time()),
+            "text": text,
+        }})
+
+    def buttons(self, message_id: int) -> list:
+        """Callback data of the buttons currently on a message."""
+        markup = self.messages[message_id].get("reply_markup") or {}
+        return [button["callback_data"] for row in markup.get("inline_keyboard", []) for button in row]
+
+    def press(self, message_id: int, data: str, user_id: str = DEFAULT_CHAT_ID) -> int:
+        """Andy taps a button on a message the bot sent. Returns its update_id."""
+        if data not in self.buttons(message_id):
+            raise ValueError(f"No button {data!r} on message {message_id}")
+        message = self.messages[message_id]
+        return self._add_update({"callback_query": {
+            "id": f"cb{self._next_update_id}",
+            "from": {"id": int(user_id), "is_bot": False},
+            "message": {
+                "message_id": message_id,
+                "chat": {"id": _chat(message["chat_id"])},
+                "text": message["text"],
+            },
+            "chat_instance": "fake",
+            "data": data,
+        }})
+
+    # --- Inspecting what was sent ---
+
+    def sent_messages(self, chat_id: str = None) -> list:
+        """sendMessage payloads that were accepted, oldest first (optionally for one chat)."""
+        with self._cond:
+            return [
+                dict(message, message_id=message_id) for message_id, message in self.messages.items()
+                if chat_id is None or message["chat_id"] == str(chat_id)
+            ]
+
+    # --- The API ---
+
+    def _take_message_id(self) -> int:
+        with self._cond:
+            message_id = self._next_message_id
+            self._next_message_id += 1
+            return message_id
+
+    def _fault(self, method: str):
+        with self._cond:
+            for fault in self._faults:
+                if fault[0] == method and fault[3] > 0:
+                    fault[3] -= 1
+                    return fault[1], fault[2]
+        return None
+
+    def call(self, method: str, payload: dict) -> tuple:
+        """Handle one Bot API call. Returns (HTTP status, response body)."""
+        if self.latency:
+            time.sleep(self.latency)
+        fault = self._fault(method)
+        if fault is not None:
+            status, retry_after = fault
+            if status == 429:
+                body = _error(429, f"Too Many Requests: retry after {retry_after}")
+                body["parameters"] = {"retry_after": retry_after}
+            else:
+                body = _error(status, "Internal Server Error" if status >= 500 else "Bad Request")
+        else:
+            handler = getattr(self, f"_api_{method}", None)
+            status, body = handler(payload) if handler else (404, _error(404, "Not Found"))
+        self.calls.append((method, payload, status))
+        return status, body
+
+    def _api_getMe(self, payload: dict) -> tuple:
+        return 200, _ok({"id": BOT_ID, "is_bot": True, "first_name": "Brain Candy", "username": "fake_bot"})
+
+    def _api_sendMessage(self, payload: dict) -> tuple:
+        chat_id, text = payload.get("chat_id"), payload.get("text")
+        if not chat_id:
+            return 400, _error(400, "Bad Request: chat_id is empty")
+        if not text:
+            return 400, _error(400, "Bad Request: message text is empty")
+        if len(text) > 4096:
+            return 400, _error(400, "Bad Request: message is too long")
+        with self._cond:
+            message_id = self._take_message_id()
+            self.messages[message_id] = {
+                "chat_id": str(chat_id),
+                "text": text,
+                "reply_markup": _json_field(payload.get("reply_markup")),
+                "sent_at": time.monotonic(),
+            }
+        return 200, _ok({"message_id": message_id, "chat": {"id": _chat(chat_id)}, "date": int(time.time()), "text": text})
+
+    def _api_getUpdates(self, payload: dict) -> tuple:
+        offset = int(payload.get("offset") or 0)
+        timeout = float(payload.get("timeout") or 0)
+        allowed = _json_field(payload.get("allowed_updates"))
+        deadline = time.monotonic() + timeout
+
+        with self._cond:
+            if self._polling:
+                return 409, _error(409, "Conflict: terminated by other getUpdates request")
+            self._polling += 1
+            try:
+                # An offset confirms (forgets) every update before it
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+                while True:
+                    found = [u for u in self._updates if not allowed or any(k in u for k in allowed)]
+                    remaining = deadline - time.monotonic()
+                    if found or remaining <= 0:
+                        return 200, _ok(found[:int(payload.get("limit") or 100)])
+                    self._cond.wait(remaining)
+            finally:
+                self._polling -= 1
+
+    def _api_answerCallbackQuery(self, payload: dict) -> tuple:
+        query_id = payload.get("callback_query_id")
+        if not query_id:
+            return 400, _error(400, "Bad Request: query id is empty")
+        self.callback_answers[query_id] = payload
+        return 200, _ok(True)
+
+    def _api_editMessageReplyMarkup(self, payload: dict) -> tuple:
+        message = self.messages.get(int(payload.get("message_id") or 0))
+        if message is None or message["chat_id"] != str(payload.get("chat_id")):
+            return 400, _error(400, "Bad Request: message to edit not found")
+        markup = _json_field(payload.get("reply_markup"))
+        if markup == message.get("reply_markup"):
+            return 400, _error(400, "Bad Request: message is not modified")
+        message["reply_markup"] = markup
+        return 200, _ok({"message_id": int(payload["message_id"]), "chat": {"id": _chat(payload["chat_id"])}})
+
+
+def _ok(result) -> dict:
+    return {"ok": True, "result": result}
+
+
+def _error(code: int, description: str) -> dict:
+    return {"ok": False, "error_code": code, "description": description}
+
+
+def _chat(chat_id):
+    """Chat ids are numbers, channel usernames ("@name") are strings."""
+    chat_id = str(chat_id)
+    return int(chat_id) if chat_id.lstrip("-").isdigit() else chat_id
+
+
+def _json_field(value):
+    """Object parameters arrive as JSON text in form/query calls."""
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _handler(telegram: FakeTelegram):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+        def _dispatch(self):
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            payload = dict(parse_qsl(url.query))
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                raw = self.rfile.read(length)
+                if "json" in self.headers.get("Content-Type", ""):
+                    payload.update(json.loads(raw or b"{}"))
+                else:
+                    payload.update(parse_qsl(raw.decode("utf-8")))
+
+            if len(parts) != 2 or not parts[0].startswith("bot"):
+                status, body = 404, _error(404, "Not Found")
+            else:
+                status, body = telegram.call(parts[1], payload)
+
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", str(body["parameters"]["retry_after"]))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = _dispatch
+        do_POST = _dispatch
+
+        def log_message(self, format, *args):
+            pass  # Quiet: the bot's own output is what matters
+
+    return Handler
+
+
+def serve(port: int = DEFAULT_PORT):
+    """Serve until interrupted, printing what the bot sends and relaying typed replies."""
+    telegram = FakeTelegram(port=port).start()
+    print(f"Fake Telegram Bot API at {telegram.base_url}")
+    print(f"Run the bot with TELEGRAM_API_BASE={telegram.base_url}")
+    print("Type a reply to send it as Andy, or /press <message_id> <callback data>")
+
+    def show_sent():
+        shown = 0
+        while True:
+            messages = telegram.sent_messages()
+            for message in messages[shown:]:
+                print(f"\n[{message['message_id']} -> {message['chat_id']}] {message['text']}")
+                for data in telegram.buttons(message["message_id"]):
+                    print(f"  button: {data}")
+            shown = len(messages)
+            time.sleep(0.2)
+
+    threading.Thread(target=show_sent, daemon=True).start()
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if line.startswith("/press "):
+                _, message_id, data = line.split(maxsplit=2)
+                try:
+                    telegram.press(int(message_id), data)
+                except (KeyError, ValueError) as e:
+                    print(f"Can't press: {e}")
+            elif line:
+                telegram.reply(line)
+        threading.Event().wait()  # stdin closed (e.g. running in the background) - keep serving
+    except KeyboardInterrupt:
+        pass
+    finally:
+        telegram.stop()
+
+
+def benchmark(messages: int = 300, chats: int = 100):
+    """Time the outbox and getUpdates long polling against the fake, with faults injected."""
+    import outbox
+    import telegram_api
+
+    with FakeTelegram() as telegram, tempfile.TemporaryDirectory() as tmp:
+        telegram_api.TELEGRAM_API_URL = telegram.base_url
+        telegram.fail("sendMessage", 429, times=3, retry_after=1)
+        telegram.fail("sendMessage", 502, times=5)
+
+        box = outbox.Outbox(Path(tmp) / "outbox.jsonl")
+        keys = [box.enqueue(str(100000 + i % chats), {"text": f"Message {i}"}, f"bench:{i}") for i in range(messages)]
+        start = time.perf_counter()
+        statuses = box.deliver(keys)
+        elapsed = time.perf_counter() - start
+
+        sent = telegram.sent_messages()
+        by_chat = {}
+        for message in sent:
+            by_chat.setdefault(message["chat_id"], []).append(message["sent_at"])
+        gaps = [b - a for times in by_chat.values() for a, b in zip(times, times[1:])]
+        texts = [message["text"] for message in sent]
+        print(f"Outbox: {messages} messages to {chats} chats in {elapsed:.2f}s "
+              f"({sum(s == 'sent' for s in statuses.values())} sent, "
+              f"{len(texts) - len(set(texts))} duplicates, "
+              f"{sum(status != 200 for method, _, status in telegram.calls if method == 'sendMessage')} faults absorbed)")
+        if gaps:
+            print(f"Outbox: closest two sends to one chat {min(gaps):.2f}s apart")
+
+        # Long poll: how long after Andy replies does getUpdates return?
+        latencies = []
+        for _ in range(20):
+            threading.Timer(0.05, telegram.reply, args=("1",)).start()
+            start = time.perf_counter()
+            response = telegram_api.call("getUpdates", {"offset": 0, "timeout": 5}, timeout=(5, 15))
+            latencies.append(time.perf_counter() - start - 0.05)
+            updates = response.json()["result"]
+            telegram_api.call("getUpdates", {"offset": updates[-1]["update_id"] + 1, "timeout": 0})
+        latencies.sort()
+        print(f"getUpdates: reply delivered in {latencies[len(latencies) // 2] * 1000:.1f}ms median, "
+              f"{latencies[-1] * 1000:.1f}ms worst")
+
+
+class OfflineWeb:
+    """
+    Stands in for every host but Telegram during --e2e: any feed URL serves
+    a small RSS feed of made-up essays, Hacker News search finds nothing,
+    and no URL redirects.
+    """
+
+    def __init__(self):
+        self.requests = 0
+
+    def _response(self, url: str, content: bytes, content_type: str):
+        import requests
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers["Content-Type"] = content_type
+        response._content = content
+        return response
+
+    def _feed(self, url: str) -> bytes:
+        host = urlparse(url).netloc
+        items = []
+        for i in range(OFFLINE_FEED_ITEMS):
+            link = f"https://{host}/offline-essay-{i}"
+            digest = hashlib.sha256(link.encode()).digest()
+            title = " ".join(OFFLINE_WORDS[b % len(OFFLINE_WORDS)] for b in digest[:5]).capitalize()
+            items.append(
+                f"<item><title>{escape(title)}</title><link>{escape(link)}</link>"
+                f"<description>An essay on {OFFLINE_WORDS[digest[5] % len(OFFLINE_WORDS)]}.</description>"
+                f"<pubDate>{formatdate(time.time() - 3600 * (i + 1))}</pubDate></item>"
+            )
+        return (f'<?xml version="1.0"?><rss version="2.0"><channel><title>{escape(host)}</title>'
+                f'{"".join(items)}</channel></rss>').encode("utf-8")
+
+    def get(self, url: str, **kwargs):
+        self.requests += 1
+        if urlparse(url).netloc == "hn.algolia.com":
+            return self._response(url, b'{"hits": []}', "application/json")
+        return self._response(url, self._feed(url), "application/rss+xml")
+
+    def head(self, url: str, **kwargs):
+        self.requests += 1
+        return self._response(url, b"", "text/plain")
+
+
+def _tap_review_card(telegram: FakeTelegram) -> int:
+    """Andy decides the latest review card: ✅ on every other item. Returns the taps made."""
+    cards = [m for m in telegram.sent_messages(DEFAULT_CHAT_ID) if telegram.buttons(m["message_id"])]
+    if not cards:
+        return 0
+    buttons = telegram.buttons(cards[-1]["message_id"])
+    item_ids = list(dict.fromkeys(data.split(":")[1] for data in buttons))
+    for i, item_id in enumerate(item_ids):
+        telegram.press(cards[-1]["message_id"], f"rate:{item_id}:{'good' if i % 2 == 0 else 'bad'}")
+    return len(item_ids)
+
+
+def e2e():
+    """
+    Run run_review_mode, post_from_queue and run_training end to end against
+    the fake, on a temporary copy of the bot state with feeds served by
+    OfflineWeb, and time each step.
+    """
+    if "state" in sys.modules:
+        # The bot modules read BRAIN_CANDY_DATA_DIR and TELEGRAM_API_BASE when imported
+        raise RuntimeError("e2e() has to run before the bot modules are imported")
+
+    here = Path(__file__).parent
+    with FakeTelegram() as telegram, tempfile.TemporaryDirectory() as tmp:
+        for name in E2E_STATE_FILES:
+            if (here / name).exists():
+                shutil.copy2(here / name, tmp)
+        os.environ["BRAIN_CANDY_DATA_DIR"] = tmp
+        os.environ["TELEGRAM_API_BASE"] = telegram.base_url
+        os.environ["TELEGRAM_BOT_TOKEN"] = "e2e"
+
+        import bot
+        import http_client
+
+        web = OfflineWeb()
+        http_client.get, http_client.head = web.get, web.head
+
+        timings = []
+
+        def step(name: str, func, *args, **kwargs):
+            sent = len(telegram.sent_messages())
+            start = time.perf_counter()
+            func(*args, **kwargs)
+            timings.append((name, time.perf_counter() - start, len(telegram.sent_messages()) - sent))
+
+        step("run_review_mode", bot.run_review_mode)
+        taps = _tap_review_card(telegram)
+        step(f"process_review_responses ({taps} taps)", bot.process_review_responses)
+        step("post_from_queue", bot.post_from_queue, count=2, build_if_empty=False)
+        step("run_training", bot.run_training)
+        awaiting = len(bot.state.get_pending())
+        telegram.reply(",".join("1" if i % 2 == 0 else "0" for i in range(awaiting)))
+        step(f"run_training ({awaiting} replies)", bot.run_training)
+
+        print("\n" + "=" * 40)
+        for name, elapsed, sent in timings:
+            print(f"{name}: {elapsed:.2f}s, {sent} messages sent")
+        posts = [m["text"] for m in telegram.sent_messages(bot.TELEGRAM_CHANNEL_ID)]
+        print(f"Channel posts: {len(posts)} ({len(posts) - len(set(posts))} duplicates)")
+        print(f"Offline web requests: {web.requests}")
+        print(f"State used: {tmp} (removed)")
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+    elif "--e2e" in sys.argv:
+        e2e()
+    else:
+        serve(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT)
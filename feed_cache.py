@@ -0,0 +1,151 @@
+"""
+Conditional-GET feed cache for Brain Candy Bot
+
+Remembers each feed's ETag / Last-Modified validators and its newest parsed
+entries. Polls send If-None-Match / If-Modified-Since, and a 304 answer is
+served from the cache without downloading or re-parsing the feed.
+
+Only the top CACHED_ENTRIES entries are kept, plus anything still newer
+than the feed's watermark, and the file is written one feed per line so
+the hourly commits stay small and diffable.
+"""
+
+import calendar
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import feedparser
+
+import http_client
+from feed_state import get_feed_state, record_fetch_success, record_fetch_failure
+
+DATA_DIR = Path(os.environ.get("BRAIN_CANDY_DATA_DIR") or Path(__file__).parent)
+FEED_CACHE_FILE = DATA_DIR / "feed_cache.json"
+
+FEED_TIMEOUT = (5, 15)  # Connect / read seconds before giving up on a feed
+SUMMARY_CHARS = 500  # Keep cached summaries short
+CACHED_ENTRIES = 10  # Newest entries kept per feed (first poll depth and cadence sample)
+
+_lock = threading.Lock()
+_cache = None
+_dirty = False
+
+
+def _load_cache() -> dict:
+    global _cache
+    if _cache is None:
+        if FEED_CACHE_FILE.exists():
+            with open(FEED_CACHE_FILE, "r") as f:
+                _cache = json.load(f)
+        else:
+            _cache = {}
+    return _cache
+
+
+def _entry_to_dict(entry) -> dict:
+    """Keep only the fields we use from a feedparser entry."""
+    published = entry.get("published_parsed") or entry.get("updated_parsed")
+    return {
+        "id": entry.get("id") or entry.get("link", ""),
+        "title": entry.get("title", "Untitled"),
+        "link": entry.get("link", ""),
+        "summary": entry.get("summary", "")[:SUMMARY_CHARS],
+        "published": calendar.timegm(published) if published else None,
+    }
+
+
+def _entries_to_keep(url: str, entries: list) -> list:
+    """
+    The newest CACHED_ENTRIES entries, extended down to the feed's watermark
+    so entries still waiting for a slot are there if the next poll is a 304.
+    """
+    watermark = get_feed_state(url).get("watermark")
+    keep = CACHED_ENTRIES
+    if watermark:
+        last_id = watermark.get("id")
+        last_published = watermark.get("published")
+        for i, entry in enumerate(entries):
+            if entry["id"] == last_id:
+                keep = max(keep, i + 1)  # Keep the stop marker too
+                break
+            published = entry.get("published")
+            if published is not None and last_published is not None and published <= last_published:
+                continue
+            keep = max(keep, i + 1)
+    return entries[:keep]
+
+
+def is_cached(url: str) -> bool:
+    """Check if we've successfully fetched this feed before."""
+    with _lock:
+        return url in _load_cache()
+
+
+def cached_entries(url: str) -> list:
+    """Get the entries from the last successful fetch without any network call."""
+    with _lock:
+        cached = _load_cache().get(url)
+    return cached["entries"] if cached else []
+
+
+def fetch_entries(url: str) -> list:
+    """
+    Fetch a feed's entries, using a conditional GET when we have validators.
+    Raises on network/HTTP errors so callers can report them.
+    """
+    global _dirty
+
+    with _lock:
+        cached = _load_cache().get(url)
+
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("modified"):
+            headers["If-Modified-Since"] = cached["modified"]
+
+    start = time.monotonic()
+    try:
+        response = http_client.get(url, headers=headers, timeout=FEED_TIMEOUT)
+        response.raise_for_status()
+    except Exception as e:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        record_fetch_failure(url, status, time.monotonic() - start, error=str(e))
+        raise
+    record_fetch_success(url, response.status_code, time.monotonic() - start)
+
+    # Unchanged since last poll - skip parsing entirely
+    if response.status_code == 304 and cached:
+        return cached["entries"]
+
+    feed = feedparser.parse(response.content)
+    entries = [_entry_to_dict(entry) for entry in feed.entries]
+    kept = _entries_to_keep(url, entries)
+
+    with _lock:
+        _load_cache()[url] = {
+            "etag": response.headers.get("ETag"),
+            "modified": response.headers.get("Last-Modified"),
+            "entries": kept,
+        }
+        _dirty = True
+
+    return entries
+
+
+def save_feed_cache():
+    """Write the cache to disk if anything changed this run."""
+    global _dirty
+
+    with _lock:
+        if not _dirty:
+            return
+        # One feed per line - still valid JSON, but a poll only changes its own line
+        lines = [f"{json.dumps(url)}: {json.dumps(_cache[url])}" for url in sorted(_cache)]
+        with open(FEED_CACHE_FILE, "w") as f:
+            f.write("{\n" + ",\n".join(lines) + "\n}\n")
+        _dirty = False
@@ -0,0 +1,250 @@
+"""
+Per-feed state for Brain Candy Bot
+
+Tracks a watermark for every feed (newest entry GUID and published
+timestamp we've already processed) so each poll only yields entries
+that appeared since the last one, and learns each feed's publishing
+cadence so a run only polls the feeds that are due.
+
+A poll only stages the new watermark; the run commits it once the
+entries have been dealt with (queued, posted or filtered out), so a
+feed whose entries are still waiting for room yields them again.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DATA_DIR = Path(os.environ.get("BRAIN_CANDY_DATA_DIR") or Path(__file__).parent)
+FEED_STATE_FILE = DATA_DIR / "feed_state.json"
+
+FIRST_POLL_DEPTH = 10  # Entries to take from a feed we've never polled
+
+_lock = threading.Lock()
+_state = None
+_dirty = False
+_staged = {}  # url -> watermark to commit once this run's entries are consumed
+
+
+def _load_state() -> dict:
+    global _state
+    if _state is None:
+        if FEED_STATE_FILE.exists():
+            with open(FEED_STATE_FILE, "r") as f:
+                _state = json.load(f)
+        else:
+            _state = {}
+    return _state
+
+
+def get_feed_state(url: str) -> dict:
+    """Get a copy of the stored state for one feed."""
+    with _lock:
+        return dict(_load_state().get(url, {}))
+
+
+def update_feed_state(url: str, **fields):
+    """Merge fields into one feed's stored state."""
+    global _dirty
+    with _lock:
+        _load_state().setdefault(url, {}).update(fields)
+        _dirty = True
+
+
+def save_feed_state():
+    """Write feed state to disk if anything changed this run."""
+    global _dirty
+    with _lock:
+        if not _dirty:
+            return
+        with open(FEED_STATE_FILE, "w") as f:
+            json.dump(_state, f, indent=1)
+        _dirty = False
+
+
+def entries_since_watermark(url: str, entries: list) -> list:
+    """
+    Return only the entries newer than this feed's watermark, and stage
+    the new watermark (see commit_watermarks). A feed we've never seen
+    yields its newest FIRST_POLL_DEPTH entries; after that there's no
+    fixed depth.
+    """
+    if not entries:
+        return []
+
+    watermark = get_feed_state(url).get("watermark")
+
+    if watermark is None:
+        new = entries[:FIRST_POLL_DEPTH]
+    else:
+        last_id = watermark.get("id")
+        last_published = watermark.get("published")
+        new = []
+        for entry in entries:
+            # Feeds list newest first - stop once we reach the last one we saw
+            if entry["id"] == last_id:
+                break
+            published = entry.get("published")
+            if published is not None and last_published is not None and published <= last_published:
+                continue
+            new.append(entry)
+
+    if new or watermark is None:
+        dated = [e for e in entries if e.get("published") is not None]
+        newest = max(dated, key=lambda e: e["published"]) if dated else entries[0]
+        with _lock:
+            _staged[url] = {"id": newest["id"], "published": newest.get("published")}
+
+    return new
+
+
+def commit_watermarks(keep=()):
+    """
+    Move forward the watermarks staged by this run's polls, except for the
+    feeds in keep (entries still waiting - they come back next poll).
+    Call save_feed_state() afterwards.
+    """
+    global _dirty
+    with _lock:
+        state = _load_state()
+        for url, watermark in _staged.items():
+            if url not in keep:
+                state.setdefault(url, {})["watermark"] = watermark
+                _dirty = True
+        _staged.clear()
+
+
+# === ADAPTIVE POLLING ===
+
+MIN_POLL_INTERVAL = 30 * 60  # Never poll a feed more than every 30 minutes
+MAX_POLL_INTERVAL = 24 * 3600  # Always check at least once a day
+DEFAULT_POLL_INTERVAL = 3600  # For feeds with no usable timestamps
+POLLS_PER_POST = 4  # Poll roughly 4 times per expected new post
+CADENCE_SAMPLE = 10  # Recent entries used to estimate the posting interval
+MAX_POLLS_PER_RUN = 200  # Cap on feeds polled in one run (most overdue first)
+
+
+def estimate_post_interval(entries: list):
+    """Median seconds between a feed's recent posts, or None if unknown."""
+    times = sorted((e["published"] for e in entries if e.get("published")), reverse=True)
+    times = times[:CADENCE_SAMPLE]
+    gaps = sorted(a - b for a, b in zip(times, times[1:]) if a > b)
+    if not gaps:
+        return None
+    return gaps[len(gaps) // 2]
+
+
+def schedule_next_poll(url: str, entries: list, found_new: bool, now: float = None):
+    """
+    Pick the next time this feed is worth polling, based on how often it
+    publishes and whether recent polls turned up anything.
+    """
+    now = now if now is not None else time.time()
+    state = get_feed_state(url)
+
+    # Consecutive polls that found nothing stretch the interval further
+    misses = 0 if found_new else state.get("misses", 0) + 1
+
+    post_interval = estimate_post_interval(entries)
+    if post_interval is None:
+        interval = DEFAULT_POLL_INTERVAL
+    else:
+        interval = post_interval / POLLS_PER_POST
+    interval *= 1.5 ** min(misses, 6)
+    interval = max(MIN_POLL_INTERVAL, min(MAX_POLL_INTERVAL, interval))
+
+    update_feed_state(url, misses=misses, post_interval=post_interval, next_poll=now + interval)
+
+
+def is_due(url: str, now: float = None) -> bool:
+    """Check if a feed's next scheduled poll has come."""
+    now = now if now is not None else time.time()
+    return get_feed_state(url).get("next_poll", 0) <= now
+
+
+def due_feeds(feeds: list, now: float = None, limit: int = MAX_POLLS_PER_RUN) -> list:
+    """
+    Filter a feed list down to the feeds that are due for a poll.
+    If more than `limit` are due, the most overdue ones win.
+    """
+    now = now if now is not None else time.time()
+    with _lock:
+        state = _load_state()
+        due = [(state.get(f["url"], {}).get("next_poll", 0), i, f) for i, f in enumerate(feeds)]
+    due = [item for item in due if item[0] <= now]
+    if len(due) > limit:
+        due = sorted(due, key=lambda item: item[:2])[:limit]
+        due.sort(key=lambda item: item[1])
+    return [f for _, _, f in due]
+
+
+# === FEED HEALTH ===
+
+FAILURE_THRESHOLD = 3  # Consecutive failures before the circuit opens
+BASE_BACKOFF = 3600  # First backoff once the circuit opens
+MAX_BACKOFF = 7 * 24 * 3600  # Probe a broken feed at least once a week
+
+
+def record_fetch_success(url: str, status: int, latency: float, now: float = None):
+    """Record a successful fetch and close the feed's circuit."""
+    now = now if now is not None else time.time()
+    update_feed_state(url, failures=0, last_status=status, last_latency=round(latency, 3), last_success=now)
+
+
+def record_fetch_failure(url: str, status, latency: float, error: str = "", now: float = None):
+    """
+    Record a failed fetch. After FAILURE_THRESHOLD failures in a row the
+    feed is skipped with exponential backoff, then probed again.
+    """
+    now = now if now is not None else time.time()
+    failures = get_feed_state(url).get("failures", 0) + 1
+
+    if failures < FAILURE_THRESHOLD:
+        retry_in = MIN_POLL_INTERVAL
+    else:
+        retry_in = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (failures - FAILURE_THRESHOLD))
+
+    update_feed_state(
+        url,
+        failures=failures,
+        last_status=status,
+        last_latency=round(latency, 3),
+        last_error=error[:200],
+        next_poll=now + retry_in,
+    )
+
+
+def feed_health_report(n: int = 10) -> str:
+    """Report the slowest and most broken feeds."""
+    with _lock:
+        state = {url: dict(s) for url, s in _load_state().items()}
+
+    broken = sorted(
+        ((url, s) for url, s in state.items() if s.get("failures", 0) > 0),
+        key=lambda item: item[1]["failures"],
+        reverse=True,
+    )[:n]
+    slow = sorted(
+        ((url, s) for url, s in state.items() if s.get("last_latency") is not None),
+        key=lambda item: item[1]["last_latency"],
+        reverse=True,
+    )[:n]
+
+    lines = [f"Most broken feeds ({len(broken)}):"]
+    for url, s in broken:
+        circuit = "open" if s["failures"] >= FAILURE_THRESHOLD else "closed"
+        lines.append(f"  {s['failures']} failures, status {s.get('last_status')}, circuit {circuit}: {url}")
+        if s.get("last_error"):
+            lines.append(f"      {s['last_error']}")
+
+    lines.append(f"Slowest feeds ({len(slow)}):")
+    for url, s in slow:
+        lines.append(f"  {s['last_latency']:.2f}s: {url}")
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(feed_health_report())
@@ -0,0 +1,57 @@
+"""
+Concurrent fetch engine for Brain Candy Bot
+
+Runs feed fetches on a bounded thread pool. Requests to the same host are
+spaced out by PER_HOST_DELAY so we stay polite without a global sleep, and
+results always come back in the same order as the input list.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# Number of feeds fetched in parallel
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", "16"))
+
+# Minimum seconds between two requests to the same host
+PER_HOST_DELAY = float(os.environ.get("PER_HOST_DELAY", "0.3"))
+
+
+class HostThrottle:
+    """Spaces out requests to the same host across worker threads."""
+
+    def __init__(self, delay: float = PER_HOST_DELAY):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url: str):
+        """Block until it's polite to hit this URL's host again."""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def fetch_all(items: list, fetch_fn, url_key=lambda item: item["url"], max_workers: int = FETCH_WORKERS) -> list:
+    """
+    Call fetch_fn on every item concurrently.
+    Returns a list of results in the same order as items.
+    """
+    if not items:
+        return []
+
+    throttle = HostThrottle()
+
+    def run(item):
+        throttle.wait(url_key(item))
+        return fetch_fn(item)
+
+    workers = max(1, min(max_workers, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, items))
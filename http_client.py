@@ -0,0 +1,87 @@
+"""
+Shared HTTP client for Brain Candy Bot
+
+One pooled requests.Session used by bot.py, discover.py and the feed
+fetcher. Connections are kept alive per host, responses are negotiated
+as gzip/brotli, and every call gets the same timeouts and retry policy.
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+USER_AGENT = "BrainCandyBot/1.0 (+https://t.me/candyforthebrain)"
+
+DEFAULT_TIMEOUT = (5, 15)  # Connect / read seconds
+POOL_CONNECTIONS = 64  # Hosts kept in the pool
+POOL_MAXSIZE = 16  # Keep-alive connections per host (matches FETCH_WORKERS)
+
+MAX_RETRY_AFTER = 5  # Longest Retry-After we sleep for before retrying (seconds)
+
+
+class CappedRetry(Retry):
+    """Retry that honours Retry-After only up to MAX_RETRY_AFTER, so one host can't stall a worker."""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_AFTER)
+
+
+# Retry idempotent requests on connection errors and server hiccups.
+# POSTs are never retried here - a retried sendMessage could double-post.
+RETRY_POLICY = CappedRetry(
+    total=2,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "HEAD"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+_lock = threading.Lock()
+_session = None
+
+
+class _Session(requests.Session):
+    """Session that applies DEFAULT_TIMEOUT unless the caller sets one."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+def get_session() -> requests.Session:
+    """Get the process-wide pooled session, creating it on first use."""
+    global _session
+    with _lock:
+        if _session is None:
+            session = _Session()
+            adapter = HTTPAdapter(
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=RETRY_POLICY,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            # ACCEPT_ENCODING includes "br" when a brotli package is installed
+            session.headers.update({
+                "User-Agent": USER_AGENT,
+                "Accept-Encoding": ACCEPT_ENCODING,
+            })
+            _session = session
+        return _session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return get_session().get(url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    return get_session().head(url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return get_session().post(url, **kwargs)
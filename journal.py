@@ -0,0 +1,81 @@
+"""
+Append-only JSONL journals for Brain Candy Bot
+
+Posted URLs and training ratings are logged one JSON line per event, so
+recording a post or rating is a single small append and each event shows
+up in git as one added line. Every so often the journal is compacted into
+its JSON snapshot file (posted.json / training_log.json) and truncated.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+_lock = threading.Lock()
+
+
+def append(path: Path, record: dict) -> int:
+    """Append one record to a journal. Returns the journal's new size in bytes."""
+    return append_many(path, [record])
+
+
+def append_many(path: Path, records: list) -> int:
+    """Append records to a journal in one write. Returns the journal's new size in bytes."""
+    lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+    with _lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+
+def read_from(path: Path, offset: int = 0) -> tuple:
+    """Read records written after byte offset. Returns (records, new_offset)."""
+    if not path.exists():
+        return [], 0
+    records = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            # Stop at a torn last line (crash mid-write)
+            if not raw.endswith(b"\n"):
+                break
+            records.append(json.loads(raw))
+            offset += len(raw)
+    return records, offset
+
+
+def size(path: Path) -> int:
+    return path.stat().st_size if path.exists() else 0
+
+
+def read_snapshot(path: Path) -> list:
+    if path.exists() and path.stat().st_size > 0:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return []
+
+
+def compact(journal_path: Path, snapshot_path: Path, to_snapshot=lambda record: record) -> int:
+    """
+    Fold the journal into its snapshot and truncate the journal.
+    Returns the number of records folded in.
+    """
+    with _lock:
+        records, _ = read_from(journal_path)
+        if not records:
+            return 0
+
+        snapshot = read_snapshot(snapshot_path)
+        snapshot.extend(to_snapshot(record) for record in records)
+
+        # Write the new snapshot atomically before dropping the journal
+        tmp_path = snapshot_path.with_suffix(snapshot_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp_path, snapshot_path)
+
+        open(journal_path, "w").close()
+        return len(records)
@@ -4,14 +4,22 @@ Brain Candy - Curated essays for @candyforthebrain
 Usage:
   python main.py              # Training mode (send to Andy for review)
   python main.py --production # Production mode (continuous posting)
-  python main.py --scheduled  # Scheduled mode (hourly 9 AM - 6 PM Chicago)
+  python main.py --scheduled  # Scheduled mode (posts 9 AM - 6 PM Chicago, crawls, discovery, replies)
+  python main.py --crawl      # Single crawl: refresh the queue and review candidates (GitHub Actions)
+  python main.py --github-actions  # Single post from the prebuilt queue (GitHub Actions)
+  python main.py --listen     # Apply Andy's replies as they arrive (long polling)
 """
 import sys
 import time
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-from bot import run_training, run_production, build_queue, post_from_queue, run_review_mode
+from bot import (
+    run_training, run_production, build_queue, post_from_queue, run_crawl, run_post,
+    listen_for_updates, poll_updates,
+)
+from discover import run_weekly_discovery
+from scheduler import Scheduler, Daily, Every
 
 # Timezone
 CHICAGO_TZ = ZoneInfo("America/Chicago")
@@ -19,6 +27,15 @@ CHICAGO_TZ = ZoneInfo("America/Chicago")
 # Schedule: post every other hour from 9 AM to 6 PM Chicago time
 POSTING_HOURS = [9, 11, 13, 15, 17]  # Every 2 hours (5 posts/day)
 
+# Scheduled mode refreshes the queue on its own cadence, not after every post
+CRAWL_INTERVAL = 60 * 60  # Seconds between queue rebuilds
+POST_CATCH_UP = 60 * 60  # A post slot missed while the bot was down still runs up to an hour late
+
+# Weekly source discovery (Sunday 10 AM Chicago, like discover.yml)
+DISCOVERY_WEEKDAY = 6  # Sunday
+DISCOVERY_HOUR = 10
+DISCOVERY_CATCH_UP = 24 * 60 * 60
+
 
 def get_chicago_time():
     """Get current time in Chicago timezone."""
@@ -31,102 +48,99 @@ def is_posting_hour():
     return chicago_now.hour in POSTING_HOURS
 
 
-def minutes_until_next_hour():
-    """Calculate minutes until the top of the next hour."""
-    chicago_now = get_chicago_time()
-    return 60 - chicago_now.minute
-
-
 def run_scheduled():
-    """Run in scheduled mode - post 1 article at the top of each hour (9 AM - 6 PM Chicago)."""
+    """Run in scheduled mode - post at each posting hour (9 AM - 6 PM Chicago), crawl and listen in between."""
     print("🍬 Brain Candy - SCHEDULED MODE")
     print("=" * 40)
-    print("Posting 1 article per hour")
+    print("Posting 1 article every other hour")
     print("Schedule: 9 AM - 6 PM Chicago time")
     print("=" * 40)
 
-    # Build initial queue
-    build_queue()
-
-    last_posted_hour = -1  # Use -1 so first post waits for top of hour
-
-    while True:
-        chicago_now = get_chicago_time()
-        current_hour = chicago_now.hour
-        current_minute = chicago_now.minute
-
-        # Post at the top of each hour (minute 0) within posting window
-        if current_minute == 0 and is_posting_hour() and current_hour != last_posted_hour:
-            print(f"\n[{chicago_now.strftime('%Y-%m-%d %H:%M %Z')}] Posting time!")
-            post_from_queue(count=1)
-            last_posted_hour = current_hour
-
-            # Rebuild queue after posting
-            build_queue()
-
-        # Log status every 15 minutes
-        if current_minute % 15 == 0 and chicago_now.second < 30:
-            next_post = f"{current_hour + 1}:00" if current_hour < 18 else "9:00 tomorrow"
-            if is_posting_hour():
-                print(f"[{chicago_now.strftime('%H:%M %Z')}] Next post at {next_post} Chicago time")
-            else:
-                print(f"[{chicago_now.strftime('%H:%M %Z')}] Outside posting hours (9 AM - 6 PM)")
-
-        # Sleep for 30 seconds before checking again
-        time.sleep(30)
-
-
-# Check mode
-SCHEDULED_MODE = "--scheduled" in sys.argv or "-s" in sys.argv
-PRODUCTION_MODE = "--production" in sys.argv or "-p" in sys.argv
-GITHUB_ACTIONS_MODE = "--github-actions" in sys.argv or "-g" in sys.argv
-
-if GITHUB_ACTIONS_MODE:
-    # Single-run mode for GitHub Actions (no loop)
-    print("Brain Candy - GITHUB ACTIONS MODE (Review Mode)")
-    print("=" * 40)
-    chicago_now = get_chicago_time()
-    print(f"Current time: {chicago_now.strftime('%Y-%m-%d %H:%M %Z')}")
-
-    if is_posting_hour():
-        print("Within posting window - running review mode...")
-        run_review_mode()
+    scheduler = Scheduler()
+    # Each job has its own worker thread, and the crawl fetches outside its run session
+    # (only the short merge into the queue takes the state lock), so a slow crawl never holds up a post
+    scheduler.add("post", lambda: post_from_queue(count=1, build_if_empty=False),
+                  Daily(POSTING_HOURS, CHICAGO_TZ), catch_up=POST_CATCH_UP)
+    scheduler.add("crawl", build_queue, Every(CRAWL_INTERVAL))
+    scheduler.add("discovery", run_weekly_discovery,
+                  Daily([DISCOVERY_HOUR], CHICAGO_TZ, weekdays=[DISCOVERY_WEEKDAY]), catch_up=DISCOVERY_CATCH_UP)
+    scheduler.add("replies", poll_updates, Every(0))
+    scheduler.run()
+
+
+def main(args):
+    """Run the mode picked by the command line flags (args excludes the script name)."""
+    scheduled_mode = "--scheduled" in args or "-s" in args
+    production_mode = "--production" in args or "-p" in args
+    github_actions_mode = "--github-actions" in args or "-g" in args
+    crawl_mode = "--crawl" in args or "-c" in args
+    listen_mode = "--listen" in args or "-l" in args
+
+    if listen_mode:
+        # Runs alongside any other mode: ratings apply within a second of Andy replying
+        print("Brain Candy - LISTEN MODE")
+        print("=" * 40)
+        listen_for_updates()
+
+    elif crawl_mode:
+        # Single crawl for GitHub Actions (crawl.yml) - fills the stores the post step reads
+        print("Brain Candy - CRAWL MODE")
+        print("=" * 40)
+        run_crawl()
         print("Done!")
-    else:
-        print(f"Outside posting hours (9 AM - 6 PM Chicago). Skipping.")
 
-    # Exit after single run
+    elif github_actions_mode:
+        # Single-run mode for GitHub Actions (no loop)
+        print("Brain Candy - GITHUB ACTIONS MODE (Review Mode)")
+        print("=" * 40)
+        chicago_now = get_chicago_time()
+        print(f"Current time: {chicago_now.strftime('%Y-%m-%d %H:%M %Z')}")
 
-elif SCHEDULED_MODE:
-    run_scheduled()
+        if is_posting_hour():
+            print("Within posting window - posting from the prebuilt queue...")
+            run_post()
+            print("Done!")
+        else:
+            print(f"Outside posting hours (9 AM - 6 PM Chicago). Skipping.")
 
-elif PRODUCTION_MODE:
-    print("🍬 Brain Candy - PRODUCTION MODE")
-    print("=" * 40)
-    print("Auto-curating and posting to @candyforthebrain")
-    print("=" * 40)
+        # Exit after single run
 
-    while True:
-        try:
-            run_production()
-        except Exception as e:
-            print(f"Error: {e}")
+    elif scheduled_mode:
+        run_scheduled()
 
-        print(f"[{datetime.now()}] Next check in 10 minutes...\n")
-        time.sleep(600)
+    elif production_mode:
+        print("🍬 Brain Candy - PRODUCTION MODE")
+        print("=" * 40)
+        print("Auto-curating and posting to @candyforthebrain")
+        print("=" * 40)
 
-else:
-    print("🍬 Brain Candy - TRAINING MODE")
-    print("=" * 40)
-    print("Sending articles to Andy for review")
-    print("Reply '1' for good, '0' for bad")
-    print("=" * 40)
+        while True:
+            try:
+                run_production()
+            except Exception as e:
+                print(f"Error: {e}")
 
-    while True:
-        try:
-            run_training()
-        except Exception as e:
-            print(f"Error: {e}")
+            print(f"[{datetime.now()}] Next check in 10 minutes...\n")
+            time.sleep(600)
 
-        print(f"[{datetime.now()}] Checking in 30 seconds...\n")
-        time.sleep(30)
+    else:
+        print("🍬 Brain Candy - TRAINING MODE")
+        print("=" * 40)
+        print("Sending articles to Andy for review")
+        print("Reply '1' for good, '0' for bad")
+        print("=" * 40)
+
+        while True:
+            try:
+                run_training()
+            except Exception as e:
+                print(f"Error: {e}")
+
+            print(f"[{datetime.now()}] Checking in 30 seconds...\n")
+            time.sleep(30)
+
+
+# Only when run as a script: flags are read from the script's own arguments,
+# so `python -c "import main"` (or importing it anywhere) never starts a mode
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,131 @@
+"""
+Near-duplicate detection for Brain Candy Bot
+
+The same story often shows up twice - from its RSS feed and from Hacker
+News - with a slightly different title and URL. Each title (and summary,
+when there is one) gets a 64-bit SimHash over its shingles. Texts that
+differ in at most MAX_DISTANCE bits are near-duplicates.
+
+The fingerprint is split into BANDS bands of 16 bits. Two fingerprints
+within MAX_DISTANCE bits of each other agree exactly on at least one band
+(pigeonhole), so candidates are found with indexed band lookups instead
+of comparing against every article. Fingerprints of posted and reviewed
+articles are kept in state.db; NearDupIndex does the same in memory.
+"""
+
+import hashlib
+import html
+import re
+
+import state
+
+BANDS = 4  # 64 bits -> 4 bands of 16 bits (state.db has one indexed column per band)
+BAND_BITS = 64 // BANDS
+MAX_DISTANCE = BANDS - 1  # Max differing bits for a near-duplicate
+MIN_TITLE_CHARS = 12  # Shorter titles are too generic to fingerprint
+MIN_SUMMARY_WORDS = 12  # Same for summaries
+TITLE_SHINGLE = 3  # Characters per title shingle
+SUMMARY_SHINGLE = 3  # Words per summary shingle
+
+TAG_RE = re.compile(r"<[^>]+>")
+# "(2019)", "[pdf]", "Show HN:" and friends don't change which story it is
+TITLE_NOISE_RE = re.compile(r"\(\d{4}\)|\[[^\]]*\]|^(show|ask|tell) hn:")
+NON_WORD_RE = re.compile(r"[^\w\s]+")
+
+_backfilled = False
+
+
+def _normalize(text: str) -> str:
+    text = html.unescape(TAG_RE.sub(" ", text)).lower()
+    text = TITLE_NOISE_RE.sub(" ", text)
+    return " ".join(NON_WORD_RE.sub(" ", text).split())
+
+
+def simhash(shingles) -> int:
+    """64-bit SimHash: each bit is the majority vote of the shingles' hashes."""
+    bits = [
+        format(int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little"), "064b")
+        for s in set(shingles)
+    ]
+    fingerprint = 0
+    for column in zip(*bits):
+        fingerprint = (fingerprint << 1) | (column.count("1") * 2 > len(bits))
+    return fingerprint
+
+
+def fingerprints(title: str, summary: str = "") -> dict:
+    """Get {"title": simhash, "summary": simhash} for whatever is long enough to fingerprint."""
+    result = {}
+    title = _normalize(title or "")
+    if len(title) >= MIN_TITLE_CHARS:
+        result["title"] = simhash(title[i:i + TITLE_SHINGLE] for i in range(len(title) - TITLE_SHINGLE + 1))
+    words = _normalize(summary or "").split()
+    if len(words) >= MIN_SUMMARY_WORDS:
+        result["summary"] = simhash(" ".join(words[i:i + SUMMARY_SHINGLE]) for i in range(len(words) - SUMMARY_SHINGLE + 1))
+    return result
+
+
+def bands(fingerprint: int) -> list:
+    """Split a fingerprint into its BANDS 16-bit band keys."""
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class NearDupIndex:
+    """In-memory LSH index of fingerprints (e.g. for the articles already in the queue)."""
+
+    def __init__(self, articles=()):
+        self._buckets = {}  # (kind, band, key) -> [(url, fingerprint)]
+        for article in articles:
+            self.add(article.get("link", ""), article.get("title", ""), article.get("summary", ""))
+
+    def add(self, url: str, title: str, summary: str = ""):
+        for kind, fingerprint in fingerprints(title, summary).items():
+            for band, key in enumerate(bands(fingerprint)):
+                self._buckets.setdefault((kind, band, key), []).append((url, fingerprint))
+
+    def find(self, title: str, summary: str = ""):
+        """URL of a near-duplicate of this title/summary, or None."""
+        for kind, fingerprint in fingerprints(title, summary).items():
+            for band, key in enumerate(bands(fingerprint)):
+                for url, other in self._buckets.get((kind, band, key), ()):
+                    if distance(fingerprint, other) <= MAX_DISTANCE:
+                        return url
+        return None
+
+
+def _backfill():
+    """Fingerprint the rating history the first time the table is used."""
+    global _backfilled
+    if _backfilled:
+        return
+    _backfilled = True
+    if state.has_fingerprints():
+        return
+    ratings = state.get_ratings()
+    with state.run_session():
+        for item in ratings:
+            remember(item.get("url", ""), item.get("title", ""), item.get("summary", ""))
+    if ratings:
+        print(f"Fingerprinted {len(ratings)} rated articles for near-duplicate checks")
+
+
+def remember(url: str, title: str, summary: str = ""):
+    """Add a posted or reviewed article to the persistent near-duplicate index."""
+    _backfill()
+    for kind, fingerprint in fingerprints(title, summary).items():
+        state.add_fingerprint(url, kind, fingerprint, bands(fingerprint))
+
+
+def find_near_duplicate(title: str, summary: str = ""):
+    """URL of a posted or reviewed article that is a near-duplicate of this one, or None."""
+    _backfill()
+    for kind, fingerprint in fingerprints(title, summary).items():
+        for url, other in state.fingerprint_candidates(kind, bands(fingerprint)):
+            if distance(fingerprint, other) <= MAX_DISTANCE:
+                return url
+    return None
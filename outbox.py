@@ -0,0 +1,291 @@
+"""
+Telegram outbox for Brain Candy Bot
+
+Every outgoing message is first written to an append-only journal
+(outbox.jsonl) under an idempotency key, e.g. "post:<url>", then sent by
+a rate-limited sender:
+- token buckets for Telegram's limits: ~30 messages/s overall, 1/s per
+  chat, 20/min per channel
+- a 429 blocks that chat for exactly the retry_after Telegram asks for
+- network errors and 5xx answers back off exponentially, up to
+  MAX_ATTEMPTS, and the message is "failed"; enqueuing its key again
+  after FAILED_RETRY starts it over
+- a 400 means Telegram won't take this message (bad markup, too long):
+  it is "rejected" for good and the caller should give up on it
+- 401/403/404 mean no message would get through (bad token, bot removed
+  from the chat): the message stays pending and delivery stops there
+- a message taken back with cancel() (e.g. a post that went back to the
+  queue) is never sent; enqueuing its key again starts it over
+
+A message is journaled as "sending" before the request goes out. If the
+run dies before the answer is recorded, the message is marked "unknown"
+on the next load and never sent again: a missed post can be redone by
+hand, a double post can't be taken back. Enqueuing a key that was
+already sent does nothing, so a re-run after a crash doesn't repeat
+what already went out.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import journal
+import telegram_api
+
+DATA_DIR = Path(os.environ.get("BRAIN_CANDY_DATA_DIR") or Path(__file__).parent)
+OUTBOX_JOURNAL = DATA_DIR / "outbox.jsonl"
+
+GLOBAL_RATE = 30.0  # Messages per second across all chats
+CHAT_RATE = 1.0  # Messages per second to one chat
+CHANNEL_RATE = 20 / 60  # Messages per second to one channel or group
+MAX_ATTEMPTS = 5  # Transient failures before a message is given up
+MAX_WAIT = 60  # Longest we sleep for a slot or retry_after; later ones are left for the next run
+KEEP_SENT = 7 * 24 * 3600  # Sent keys are kept this long for idempotency
+FAILED_RETRY = 60 * 60  # A key that ran out of attempts may be enqueued again after this long
+COMPACT_BYTES = 64 * 1024  # Rewrite the journal without stale entries past this size
+
+DONE = ("sent", "failed", "rejected", "unknown", "cancelled")
+BOT_ERRORS = (401, 403, 404)  # Answers about the bot or the chat, not the message
+
+
+class TokenBucket:
+    """Allows `rate` events per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # monotonic time before which nothing may be sent (retry_after)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available."""
+        self._refill(now)
+        return max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.0)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def _is_channel(chat_id: str) -> bool:
+    """Channel usernames ("@name") and channel/supergroup ids ("-100...")."""
+    return str(chat_id).startswith(("@", "-"))
+
+
+class Outbox:
+    """Durable, rate-limited queue of Telegram messages."""
+
+    def __init__(self, path: Path = OUTBOX_JOURNAL):
+        self.path = path
+        self._lock = threading.RLock()
+        self._messages = {}  # key -> latest record
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._chats = {}  # chat_id -> TokenBucket
+        self._load()
+
+    def _load(self):
+        records, _ = journal.read_from(self.path)
+        for record in records:
+            self._messages[record["key"]] = record
+        for record in list(self._messages.values()):
+            if record["status"] == "sending":
+                # Crashed between sending and recording the answer - don't risk a double post
+                print(f"Outbox: delivery of {record['key']} is unknown, not resending")
+                self._save(dict(record, status="unknown"))
+
+    def _save(self, record: dict):
+        record["updated"] = time.time()
+        self._messages[record["key"]] = record
+        journal.append(self.path, record)
+
+    def _bucket(self, chat_id: str) -> TokenBucket:
+        chat_id = str(chat_id)
+        if chat_id not in self._chats:
+            self._chats[chat_id] = TokenBucket(CHANNEL_RATE if _is_channel(chat_id) else CHAT_RATE)
+        return self._chats[chat_id]
+
+    def status(self, key: str):
+        record = self._messages.get(key)
+        return record["status"] if record else None
+
+    def enqueue(self, chat_id: str, payload: dict, key: str = None) -> str:
+        """
+        Durably queue a message. Returns its key; an existing key is left as
+        it is, unless it was cancelled or failed more than FAILED_RETRY ago.
+        """
+        key = key or f"msg:{uuid.uuid4().hex}"
+        with self._lock:
+            record = self._messages.get(key)
+            if record is None or record["status"] == "cancelled" or \
+                    (record["status"] == "failed" and record["updated"] < time.time() - FAILED_RETRY):
+                self._save({
+                    "key": key,
+                    "chat_id": str(chat_id),
+                    "payload": dict(payload, chat_id=chat_id),
+                    "status": "pending",
+                    "attempts": 0,
+                    "next_attempt": 0,
+                    "message_id": None,
+                })
+        return key
+
+    def _claim(self, record: dict) -> dict:
+        """Take rate limit tokens and mark a message as sending. Caller holds the lock."""
+        now = time.monotonic()
+        self._global.take(now)
+        self._bucket(record["chat_id"]).take(now)
+        self._save(dict(record, status="sending", attempts=record["attempts"] + 1))
+        return self._messages[record["key"]]
+
+    def cancel(self, key: str):
+        """Take back a message still waiting to go out (one already sent or being sent stays as it is)."""
+        with self._lock:
+            record = self._messages.get(key)
+            if record is not None and record["status"] == "pending":
+                self._save(dict(record, status="cancelled"))
+
+    def _send_one(self, record: dict) -> bool:
+        """
+        Send a claimed message and record the outcome. Called without the
+        lock. Returns False if delivery should stop (see BOT_ERRORS).
+        """
+        try:
+            response = telegram_api.call("sendMessage", record["payload"])
+            status_code = response.status_code
+            body = response.json() if response.content else {}
+        except Exception as e:
+            print(f"Error sending message: {e}")
+            status_code, body = None, {}
+
+        with self._lock:
+            if status_code == 200 and body.get("ok", True):
+                message_id = (body.get("result") or {}).get("message_id")
+                self._save(dict(record, status="sent", message_id=message_id))
+            elif status_code == 429:
+                # Wait exactly as long as Telegram asks - this doesn't count as a failed attempt
+                retry_after = (body.get("parameters") or {}).get("retry_after", 1)
+                self._bucket(record["chat_id"]).block(retry_after)
+                print(f"Outbox: rate limited for {retry_after}s ({record['chat_id']})")
+                self._save(dict(record, status="pending", attempts=record["attempts"] - 1,
+                                next_attempt=time.time() + retry_after))
+            elif status_code == 400:
+                print(f"Outbox: {record['key']} rejected ({status_code}): {body.get('description', '')}")
+                self._save(dict(record, status="rejected"))
+            elif status_code in BOT_ERRORS:
+                # Every other message would get the same answer - keep this one and stop
+                print(f"Outbox: {status_code} sending {record['key']}: {body.get('description', '')} - stopping delivery")
+                self._save(dict(record, status="pending", attempts=record["attempts"] - 1))
+                return False
+            elif record["attempts"] >= MAX_ATTEMPTS:
+                print(f"Outbox: giving up on {record['key']} after {record['attempts']} attempts")
+                self._save(dict(record, status="failed"))
+            else:
+                self._save(dict(record, status="pending", next_attempt=time.time() + 2 ** record["attempts"]))
+        return True
+
+    def _next_due(self, wanted: list):
+        """(seconds to wait, record) for the wanted message that can go out first, or None."""
+        pending = [self._messages[k] for k in wanted if self.status(k) == "pending"]
+        if not pending:
+            return None
+        # Next message to go out: the one whose chat frees up first
+        now_wall, now = time.time(), time.monotonic()
+        waits = [
+            (max(r["next_attempt"] - now_wall,
+                 self._bucket(r["chat_id"]).wait_time(now),
+                 self._global.wait_time(now)), i)
+            for i, r in enumerate(pending)
+        ]
+        wait, i = min(waits)
+        return wait, pending[i]
+
+    def deliver(self, keys=None, max_wait: float = MAX_WAIT) -> dict:
+        """
+        Send pending messages (all of them, or just keys) as fast as the rate
+        limits allow. Waits for a slot or a retry_after of up to max_wait
+        seconds; anything due later stays pending for the next run.
+        Returns {key: status} for the messages it looked at.
+
+        The lock only covers picking and claiming a message: waits and
+        requests happen outside it, so other threads can queue and send
+        meanwhile. A claimed message is "sending" and no one else picks it.
+        """
+        with self._lock:
+            wanted = list(keys) if keys is not None else [
+                k for k, r in self._messages.items() if r["status"] == "pending"
+            ]
+        while True:
+            with self._lock:
+                due = self._next_due(wanted)
+                if due is None or due[0] > max_wait:
+                    break
+                wait, record = due
+                if wait <= 0:
+                    record = self._claim(record)
+            if wait > 0:
+                # Slots may change while we sleep (other threads, a 429) - look again after
+                time.sleep(wait)
+                continue
+            if not self._send_one(record):
+                break
+
+        with self._lock:
+            self._compact()
+            return {k: self.status(k) for k in wanted}
+
+    def _compact(self):
+        """Rewrite the journal keeping unfinished messages and recently sent keys."""
+        if journal.size(self.path) < COMPACT_BYTES:
+            return
+        cutoff = time.time() - KEEP_SENT
+        self._messages = {
+            k: r for k, r in self._messages.items() if r["status"] not in DONE or r["updated"] > cutoff
+        }
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self._messages.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+        return _outbox
+
+
+def send(chat_id: str, payload: dict, key: str = None) -> bool:
+    """
+    Queue a message and deliver it now. True if it has gone out (now or in an
+    earlier run) - or may have, if an earlier run died while sending it.
+    """
+    outbox = get_outbox()
+    key = outbox.enqueue(chat_id, payload, key)
+    return outbox.deliver([key]).get(key) in ("sent", "unknown")
+
+
+def deliver_pending():
+    """Retry messages left pending by earlier runs (5xx, long retry_after)."""
+    statuses = get_outbox().deliver()
+    if statuses:
+        sent = sum(1 for status in statuses.values() if status == "sent")
+        print(f"Outbox: delivered {sent} of {len(statuses)} pending messages")
@@ -0,0 +1,154 @@
+"""
+Priority queue of articles waiting to be posted, for Brain Candy Bot
+
+Articles are ranked by score (plus the "more like this" bonus), decayed
+by age with a half-life. Since every article decays at the same rate,
+the order never changes over time, so each article gets a fixed heap key:
+log(priority) + decay rate * time queued.
+
+Constraints are part of the structure:
+- at most max_per_source articles per source
+- at most max_size articles; a new article evicts the lowest one.
+  Articles Andy approved by hand ("approved") are never evicted
+- pop() skips whole sources (e.g. ones already posted today) and returns
+  the best eligible article without scanning the rest
+
+Each source has its own max-heap, and a heap of sources is keyed by each
+source's best article. Removed entries are dropped lazily.
+"""
+
+import heapq
+import itertools
+import math
+from datetime import datetime
+
+MAX_SIZE = 50  # Articles kept in the queue
+MAX_PER_SOURCE = 2  # Articles per source in the queue (diversity)
+AGE_HALF_LIFE_HOURS = 48  # An article's priority halves every 2 days it waits
+SIMILARITY_WEIGHT = 0.2  # Priority bonus per unit of "more like this" similarity
+
+DECAY_PER_SECOND = math.log(2) / (AGE_HALF_LIFE_HOURS * 3600)
+
+
+def priority(article: dict) -> float:
+    """Undecayed priority: score plus the similarity bonus."""
+    return article.get("score", 0) + SIMILARITY_WEIGHT * article.get("similarity", 0)
+
+
+def heap_key(article: dict) -> float:
+    """Time-invariant ranking key: log of the age-decayed priority, shifted by a constant."""
+    queued_at = datetime.fromisoformat(article["queued_at"]).timestamp()
+    return math.log(max(priority(article), 1e-9)) + DECAY_PER_SECOND * queued_at
+
+
+class PostQueue:
+    """Diversity-constrained max-priority queue of articles."""
+
+    def __init__(self, articles=(), max_size: int = MAX_SIZE, max_per_source: int = MAX_PER_SOURCE):
+        self.max_size = max_size
+        self.max_per_source = max_per_source
+        self._ids = itertools.count()
+        self._entries = {}  # id -> (key, source, article) for live articles
+        self._by_source = {}  # source -> max-heap of (-key, id)
+        self._sources = []  # max-heap of (-best key, source); may hold stale keys
+        self._lowest = []  # min-heap of (key, id) of evictable articles; may hold removed ids
+        for article in articles:
+            self.push(article, force=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def source_count(self, source: str) -> int:
+        return len(self._by_source.get(source, ()))
+
+    def _lowest_key(self):
+        while self._lowest and self._lowest[0][1] not in self._entries:
+            heapq.heappop(self._lowest)
+        return self._lowest[0][0] if self._lowest else None
+
+    def can_push(self, article: dict) -> bool:
+        """Would push() accept this article? (Check before doing expensive work on it.)"""
+        if self.source_count(article.get("source", "")) >= self.max_per_source:
+            return False
+        if len(self) < self.max_size:
+            return True
+        lowest = self._lowest_key()
+        if lowest is None:
+            return False
+        article = dict(article)
+        article.setdefault("queued_at", datetime.now().isoformat())
+        return heap_key(article) > lowest
+
+    def push(self, article: dict, force: bool = False) -> bool:
+        """
+        Add an article (stamping queued_at if it has none). Returns False if it
+        was turned away by the per-source cap or a full queue of better articles.
+        force skips the per-source cap (articles approved by hand, loading old queues).
+        An approved article is always taken, evicting the lowest other one if it can.
+        """
+        article.setdefault("queued_at", datetime.now().isoformat())
+        source = article.get("source", "")
+        if not force and self.source_count(source) >= self.max_per_source:
+            return False
+        key = heap_key(article)
+        pinned = article.get("approved", False)
+        if len(self) >= self.max_size:
+            lowest = self._lowest_key()
+            if not pinned and (lowest is None or key <= lowest):
+                return False
+            if lowest is not None:
+                self._remove(self._lowest[0][1])
+
+        entry_id = next(self._ids)
+        self._entries[entry_id] = (key, source, article)
+        heap = self._by_source.setdefault(source, [])
+        heapq.heappush(heap, (-key, entry_id))
+        if not pinned:
+            heapq.heappush(self._lowest, (key, entry_id))
+        if heap[0][1] == entry_id:
+            heapq.heappush(self._sources, (-key, source))
+        return True
+
+    def _remove(self, entry_id: int):
+        """Drop an entry (the evicted lowest article)."""
+        _, source, _ = self._entries.pop(entry_id)
+        heap = self._by_source[source]
+        heap.remove(next(item for item in heap if item[1] == entry_id))  # At most max_per_source items
+        heapq.heapify(heap)
+        if not heap:
+            del self._by_source[source]
+        else:
+            heapq.heappush(self._sources, (heap[0][0], source))
+
+    def pop(self, skip_sources=frozenset(), is_eligible=None):
+        """
+        Remove and return the best article whose source isn't in skip_sources
+        and whose top article passes is_eligible(article), or None.
+        A source whose top article isn't eligible is passed over for this pop.
+        """
+        passed_over = []
+        found = None
+        while self._sources:
+            neg_key, source = heapq.heappop(self._sources)
+            heap = self._by_source.get(source)
+            if not heap or heap[0][0] != neg_key:
+                continue  # Stale: the source's best article changed since this was pushed
+            if source in skip_sources or (is_eligible is not None and not is_eligible(self._entries[heap[0][1]][2])):
+                passed_over.append((neg_key, source))
+                continue
+
+            _, entry_id = heapq.heappop(heap)
+            found = self._entries.pop(entry_id)[2]
+            if heap:
+                heapq.heappush(self._sources, (heap[0][0], source))
+            else:
+                del self._by_source[source]
+            break
+
+        for item in passed_over:
+            heapq.heappush(self._sources, item)
+        return found
+
+    def articles(self) -> list:
+        """All queued articles, best first (for saving)."""
+        return [article for _, _, article in sorted(self._entries.values(), key=lambda e: e[0], reverse=True)]
@@ -0,0 +1,187 @@
+"""
+Job scheduler for Brain Candy Bot's scheduled mode
+
+A heap of (due time, job). The scheduler sleeps until the earliest job is
+due, hands it to a worker thread and goes back to sleep - no polling every
+30 seconds. Every job has a worker of its own and a job never overlaps
+itself, so the scheduler keeps time and update polling keeps listening
+while a long crawl runs. State changes still happen one job at a time:
+run sessions take turns (see state.py). Jobs keep their network work
+outside their sessions where it's long (the crawl's fetches, the update
+long poll), so a post due mid-crawl waits at most for the crawl's short
+merge into the queue.
+
+Two kinds of schedule:
+- Daily: wall-clock times in a timezone (post slots, weekly discovery).
+  Slots are built from the local date and hour each day, so they stay at
+  9:00 Chicago across DST changes; a slot that falls in a spring-forward
+  gap moves to the first valid time after it.
+- Every: a fixed delay after the previous run finishes (queue refresh,
+  update polling).
+
+Missed slots: each daily job records its last slot in state.db. If the bot
+starts (or wakes from a stall) within a job's catch-up window of a slot
+that didn't run, the slot runs now; older misses are skipped, and several
+missed slots only run once.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from datetime import time as clock_time
+
+import state
+
+MAX_SLEEP = 60  # Re-check at least this often, in case the wall clock jumps (suspend, NTP)
+LATE_GRACE = 15 * 60  # A Daily slot still runs this late even without a catch-up window
+
+
+class Daily:
+    """Wall-clock slots: the given hours (and minute) of the chosen weekdays in tz."""
+
+    def __init__(self, hours, tz, minute: int = 0, weekdays=None):
+        self.hours = sorted(hours)
+        self.minute = minute
+        self.tz = tz
+        self.weekdays = set(weekdays) if weekdays is not None else None  # 0 = Monday
+
+    def _slots(self, day):
+        if self.weekdays is not None and day.weekday() not in self.weekdays:
+            return []
+        slots = []
+        for hour in self.hours:
+            local = datetime.combine(day, clock_time(hour, self.minute), tzinfo=self.tz)
+            # Round trip through UTC: a nonexistent local time moves past the DST gap
+            slots.append(datetime.fromtimestamp(local.timestamp(), self.tz))
+        return slots
+
+    def next_after(self, moment: datetime) -> datetime:
+        """First slot strictly after moment."""
+        day = moment.astimezone(self.tz).date()
+        for offset in range(8):
+            for slot in self._slots(day + timedelta(days=offset)):
+                if slot > moment:
+                    return slot
+        raise ValueError("Schedule has no slots")
+
+    def last_at_or_before(self, moment: datetime):
+        """Latest slot at or before moment (within the past week), or None."""
+        day = moment.astimezone(self.tz).date()
+        for offset in range(8):
+            for slot in reversed(self._slots(day - timedelta(days=offset))):
+                if slot <= moment:
+                    return slot
+        return None
+
+    def describe(self) -> str:
+        times = ", ".join(f"{hour}:{self.minute:02d}" for hour in self.hours)
+        return f"daily at {times} {self.tz.key}"
+
+
+class Every:
+    """A fixed delay after the previous run finishes (the first run starts right away)."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def describe(self) -> str:
+        return f"every {self.seconds:g}s" if self.seconds else "continuously"
+
+
+class Job:
+    def __init__(self, name: str, func, schedule, catch_up: float = 0):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.catch_up = catch_up  # Seconds after a missed Daily slot it may still run
+        self.running = False
+
+
+class Scheduler:
+    """Runs jobs when they're due, each on its own worker thread."""
+
+    def __init__(self):
+        self.jobs = []
+        self._heap = []  # (due epoch seconds, tiebreak, job)
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._pool = None
+
+    def add(self, name: str, func, schedule, catch_up: float = 0) -> Job:
+        job = Job(name, func, schedule, catch_up)
+        self.jobs.append(job)
+        return job
+
+    def _push(self, job: Job, due: float):
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._order), job))
+            self._cond.notify()
+
+    def _first_due(self, job: Job, now: float) -> float:
+        if isinstance(job.schedule, Every):
+            return now
+        moment = datetime.fromtimestamp(now, job.schedule.tz)
+        last_slot = job.schedule.last_at_or_before(moment)
+        done = state.get_schedule_mark(job.name)
+        if job.catch_up and last_slot is not None and now - last_slot.timestamp() <= job.catch_up \
+                and (done is None or done < last_slot.timestamp()):
+            print(f"Catching up on {job.name} slot at {last_slot.strftime('%H:%M %Z')}")
+            return last_slot.timestamp()
+        return job.schedule.next_after(moment).timestamp()
+
+    def _run(self, job: Job, due: float):
+        try:
+            job.func()
+        except Exception as e:
+            print(f"Error in {job.name}: {e}")
+        finally:
+            # Clear the flag first: if saving the mark fails, the job must still be able to run again
+            with self._cond:
+                job.running = False
+            if isinstance(job.schedule, Daily):
+                try:
+                    state.save_schedule_mark(job.name, due)
+                except Exception as e:
+                    print(f"Error saving {job.name} schedule mark: {e}")
+            if isinstance(job.schedule, Every):
+                self._push(job, time.time() + job.schedule.seconds)
+
+    def _dispatch(self, job: Job, due: float, now: float):
+        if isinstance(job.schedule, Daily):
+            # Next slot after now: slots missed while stalled collapse into this run
+            self._push(job, job.schedule.next_after(datetime.fromtimestamp(now, job.schedule.tz)).timestamp())
+            slot = datetime.fromtimestamp(due, job.schedule.tz).strftime('%Y-%m-%d %H:%M %Z')
+            if now - due > max(job.catch_up, LATE_GRACE):
+                print(f"Missed {job.name} slot at {slot}, too late to catch up")
+                return
+            if job.running:
+                print(f"Skipping {job.name} slot at {slot}: previous run still going")
+                return
+            print(f"\n[{slot}] Running {job.name}")
+
+        with self._cond:
+            job.running = True
+        self._pool.submit(self._run, job, due)
+
+    def run(self):
+        """Run forever."""
+        self._pool = ThreadPoolExecutor(max_workers=len(self.jobs), thread_name_prefix="job")
+        now = time.time()
+        for job in self.jobs:
+            due = self._first_due(job, now)
+            self._push(job, due)
+            print(f"{job.name}: {job.schedule.describe()} (next {datetime.fromtimestamp(due).astimezone():%a %H:%M %Z})")
+
+        while True:
+            with self._cond:
+                while True:
+                    now = time.time()
+                    if self._heap and self._heap[0][0] <= now:
+                        due, _, job = heapq.heappop(self._heap)
+                        break
+                    timeout = min(self._heap[0][0] - now, MAX_SLEEP) if self._heap else MAX_SLEEP
+                    self._cond.wait(timeout)
+            self._dispatch(job, due, now)
@@ -0,0 +1,153 @@
+"""
+"More like this" similarity index for Brain Candy Bot
+
+A TF-IDF index over the titles (and summaries, when we have them) of the
+articles rated good in training plus the canonical readings. Documents
+are hashed term-count rows of a sparse matrix, appended as new good
+ratings come in; IDF weights are applied when the matrix is used, so
+adding a document never rewrites the others.
+
+Scoring a batch of candidates against the whole corpus is one sparse
+matrix product, followed by a top-k per candidate.
+"""
+
+import html
+import re
+import threading
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+import state
+from canonical import CANONICAL_READINGS
+from urls import normalize_url
+
+HASH_BITS = 18  # 2^18 hashed term slots
+TOP_K = 3  # A candidate's similarity is its mean cosine with its TOP_K closest documents
+CHUNK_ROWS = 1024  # Candidates per dense block when picking the top k
+
+TAG_RE = re.compile(r"<[^>]+>")
+WORD_RE = re.compile(r"[a-z0-9']{2,}")
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have how i in is it its my no not of on or our
+    so that the their this to was we what when where which who why will with you your
+""".split())
+
+_lock = threading.Lock()
+_index = None
+
+
+def term_counts(title: str, summary: str = "") -> tuple:
+    """(hashed term ids, counts) for an article's title and summary."""
+    text = html.unescape(TAG_RE.sub(" ", f"{title} {summary or ''}")).lower()
+    mask = (1 << HASH_BITS) - 1
+    counts = {}
+    for word in WORD_RE.findall(text):
+        if word not in STOPWORDS:
+            term = zlib.crc32(word.encode("utf-8")) & mask
+            counts[term] = counts.get(term, 0) + 1
+    return list(counts), list(counts.values())
+
+
+def _tf_matrix(docs: list) -> sparse.csr_matrix:
+    """Rows of sublinear term frequencies (1 + log count) for [(terms, counts)]."""
+    indptr = np.cumsum([0] + [len(terms) for terms, _ in docs])
+    indices = np.fromiter((t for terms, _ in docs for t in terms), dtype=np.int64, count=indptr[-1])
+    counts = np.fromiter((c for _, counts in docs for c in counts), dtype=np.float64, count=indptr[-1])
+    return sparse.csr_matrix((1.0 + np.log(counts), indices, indptr), shape=(len(docs), 1 << HASH_BITS))
+
+
+class SimilarityIndex:
+    """TF-IDF document matrix with incremental appends."""
+
+    def __init__(self):
+        self.labels = []  # One per document (its normalized URL)
+        self._positions = {}  # label -> row
+        self.ratings_seen = 0  # Ratings folded in so far (see get_index)
+        self.doc_freq = np.zeros(1 << HASH_BITS)
+        self._tf = _tf_matrix([])
+        self._pending = []  # (terms, counts) not yet stacked into _tf
+        self._weighted = None  # L2-normalized TF-IDF rows, rebuilt after adds
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def add(self, url: str, title: str, summary: str = ""):
+        label = normalize_url(url)
+        terms, counts = term_counts(title, summary)
+        if not terms or label in self._positions:
+            return
+        self._positions[label] = len(self.labels)
+        self.labels.append(label)
+        self.doc_freq[terms] += 1
+        self._pending.append((terms, counts))
+        self._weighted = None
+
+    def _idf(self) -> np.ndarray:
+        return np.log((1 + len(self)) / (1 + self.doc_freq)) + 1
+
+    def _normalize(self, tf: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+        weighted = sparse.csr_matrix(tf.multiply(idf))
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ weighted
+
+    def _documents(self) -> sparse.csr_matrix:
+        if self._pending:
+            self._tf = sparse.vstack([self._tf, _tf_matrix(self._pending)], format="csr")
+            self._pending = []
+        if self._weighted is None:
+            self._weighted = self._normalize(self._tf, self._idf())
+        return self._weighted
+
+    def top_k(self, articles: list, k: int = TOP_K) -> tuple:
+        """(cosines, document indices) of each article's k closest documents, best first."""
+        k = min(k, len(self))
+        if k == 0 or not articles:
+            return np.zeros((len(articles), 0)), np.zeros((len(articles), 0), dtype=np.int64)
+
+        docs = self._documents()
+        queries = self._normalize(
+            _tf_matrix([term_counts(a.get("title", ""), a.get("summary", "")) for a in articles]), self._idf()
+        )
+        cosines = (queries @ docs.T).tolil()
+        # An article already in the corpus shouldn't count as similar to itself
+        for row, article in enumerate(articles):
+            own = self._positions.get(normalize_url(article.get("link", "")))
+            if own is not None:
+                cosines[row, own] = 0.0
+        cosines = cosines.tocsr()
+
+        best = np.zeros((len(articles), k))
+        best_ids = np.zeros((len(articles), k), dtype=np.int64)
+        for start in range(0, len(articles), CHUNK_ROWS):
+            block = cosines[start:start + CHUNK_ROWS].toarray()
+            ids = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            values = np.take_along_axis(block, ids, axis=1)
+            order = np.argsort(-values, axis=1)
+            best[start:start + CHUNK_ROWS] = np.take_along_axis(values, order, axis=1)
+            best_ids[start:start + CHUNK_ROWS] = np.take_along_axis(ids, order, axis=1)
+        return best, best_ids
+
+    def similarity(self, articles: list, k: int = TOP_K) -> np.ndarray:
+        """Mean cosine of each article with its k closest documents (0 for an empty index)."""
+        best, _ = self.top_k(articles, k)
+        return best.mean(axis=1) if best.shape[1] else np.zeros(len(articles))
+
+
+def get_index() -> SimilarityIndex:
+    """Index of good-rated articles and canonical readings, caught up with the ratings."""
+    global _index
+    with _lock:
+        total = state.count_ratings()
+        if _index is None or total < _index.ratings_seen:
+            _index = SimilarityIndex()
+            for canon in CANONICAL_READINGS:
+                _index.add(canon["url"], canon["title"], canon.get("category", ""))
+        if total > _index.ratings_seen:
+            for item in state.get_ratings(_index.ratings_seen):
+                if item.get("rating") == "good":
+                    _index.add(item.get("url", ""), item.get("title", ""), item.get("summary", ""))
+            _index.ratings_seen = total
+        return _index
@@ -0,0 +1,71 @@
+"""
+Source policy index for Brain Candy Bot
+
+Answers "is this source rejected / paused?" with hashed lookups on the
+source name and on the URL's host and parent domains. Rejected sources
+are reloaded from the state store only when state.db's mtime changes
+(or when we reject something ourselves). Blocked domains go through the
+compiled DomainMatcher from blocklist.py.
+"""
+
+import os
+import threading
+from urllib.parse import urlparse
+
+import state
+
+
+def domain_suffixes(url: str) -> list:
+    """www.blog.example.com -> ["blog.example.com", "example.com", "com"]"""
+    host = urlparse(url).netloc.replace("www.", "").lower().split(":")[0]
+    labels = host.split(".")
+    return [".".join(labels[i:]) for i in range(len(labels))] if host else []
+
+
+class SourcePolicy:
+    """Rejected and paused source rules, indexed for O(1) checks."""
+
+    def __init__(self, paused: dict, blocked_domains=None):
+        self.paused = dict(paused)  # source name or domain -> expiry date (YYYY-MM-DD)
+        self.blocked_domains = blocked_domains  # DomainMatcher
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._rejected_sources = frozenset()
+        self._rejected_domains = frozenset()
+
+    def invalidate(self):
+        """Force a reload on the next check (e.g. after rejecting a source)."""
+        with self._lock:
+            self._mtime = None
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(state.STATE_DB).st_mtime_ns
+        except FileNotFoundError:
+            mtime = 0
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            rejected = state.get_rejected()
+            self._rejected_sources = frozenset(rejected["sources"])
+            self._rejected_domains = frozenset(rejected["domains"])
+            self._mtime = mtime
+
+    def is_rejected(self, source: str, url: str = "") -> bool:
+        self._refresh()
+        if source in self._rejected_sources:
+            return True
+        return any(d in self._rejected_domains for d in domain_suffixes(url))
+
+    def is_blocked_domain(self, domain: str) -> bool:
+        return self.blocked_domains is not None and self.blocked_domains.match(domain) is not None
+
+    def is_paused(self, source: str, url: str, today: str) -> bool:
+        expiry = self.paused.get(source)
+        if expiry is not None and expiry >= today:
+            return True
+        for d in domain_suffixes(url):
+            expiry = self.paused.get(d)
+            if expiry is not None and expiry >= today:
+                return True
+        return False
@@ -0,0 +1,947 @@
+"""
+SQLite state store for Brain Candy Bot
+
+All bot state (posted URLs, ratings, queue, reviews, source lists) lives
+in one indexed SQLite database instead of a pile of JSON files that get
+fully rewritten on every change.
+
+state.db itself is a cache and stays out of git. What gets committed is
+text: the journals below, plus the queue, reviews, source lists, URL
+aliases and the few meta values that matter (update offset, schedule
+marks), exported as JSON files after each run. When those files differ
+from what the database last exported - a fresh checkout, a pull - they
+are imported again, and the rest (source stats, URL index) is rebuilt.
+
+Posted URLs and ratings are journaled (see journal.py): posted.jsonl and
+training_log.jsonl, compacted into posted.json and training_log.json, are
+the record of those logs, and their tables here are an index that catches
+up with the journal tail whenever the database is opened.
+
+Near-duplicate checks use SimHash fingerprints of posted and reviewed
+titles/summaries, looked up by LSH band (see neardup.py). They are
+journaled the same way (fingerprints.jsonl / fingerprints.json), since
+posted records don't carry the titles they'd be rebuilt from.
+
+The offset of the last Telegram update handled is kept in meta, so the
+ratings an update carries and its acknowledgement commit together.
+
+Dedup checks (is_seen) go through a memory-mapped index of URL hashes
+(see url_index.py) that is rebuilt from the tables if it falls out of
+step with them.
+
+A bot run wraps itself in run_session(): each piece of state is read from
+the database once and then served from memory, and every change made
+during the run is flushed in a single transaction at the end. Since that
+transaction is open for the whole session, sessions (and writes outside
+one) take turns on a process-wide lock: threads of the scheduler never
+run into "database is locked" or flush over each other's cached state.
+"""
+
+import atexit
+import copy
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import journal
+from url_index import UrlIndex, url_hash
+from urls import normalize_url
+
+# State files live next to the code unless BRAIN_CANDY_DATA_DIR points elsewhere
+# (e.g. a scratch copy for offline runs, see fake_telegram.py)
+DATA_DIR = Path(os.environ.get("BRAIN_CANDY_DATA_DIR") or Path(__file__).parent)
+STATE_DB = DATA_DIR / "state.db"
+
+POSTED_SNAPSHOT = DATA_DIR / "posted.json"
+POSTED_JOURNAL = DATA_DIR / "posted.jsonl"
+RATINGS_SNAPSHOT = DATA_DIR / "training_log.json"
+RATINGS_JOURNAL = DATA_DIR / "training_log.jsonl"
+FINGERPRINTS_SNAPSHOT = DATA_DIR / "fingerprints.json"
+FINGERPRINTS_JOURNAL = DATA_DIR / "fingerprints.jsonl"
+COMPACT_JOURNAL_BYTES = 64 * 1024  # Fold a journal into its snapshot past this size
+# Half-life of a rating's weight in source trust scores (0 = every rating counts forever)
+TRUST_HALF_LIFE_DAYS = float(os.environ.get("TRUST_HALF_LIFE_DAYS", "0"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS posted (
+    url TEXT PRIMARY KEY,  -- normalized
+    posted_at TEXT
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,  -- normalized
+    source TEXT,
+    rating TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ratings_url ON ratings (url);
+CREATE INDEX IF NOT EXISTS ratings_source ON ratings (source, rating);
+CREATE TABLE IF NOT EXISTS source_stats (
+    source TEXT PRIMARY KEY,
+    good INTEGER NOT NULL,
+    bad INTEGER NOT NULL,
+    good_weight REAL NOT NULL,  -- time-decayed counts (see TRUST_HALF_LIFE_DAYS)
+    bad_weight REAL NOT NULL,
+    decayed_at REAL NOT NULL  -- epoch seconds the weights are decayed to
+);
+CREATE TABLE IF NOT EXISTS queue (
+    position INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,  -- normalized
+    source TEXT,
+    score REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS queue_url ON queue (url);
+CREATE INDEX IF NOT EXISTS queue_source ON queue (source);
+CREATE TABLE IF NOT EXISTS pending_review (
+    position INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS approved (
+    position INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS review_candidates (
+    position INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_sources (
+    date TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (date, source)
+);
+CREATE TABLE IF NOT EXISTS rejected_sources (
+    kind TEXT NOT NULL,  -- "source" or "domain"
+    value TEXT NOT NULL,
+    PRIMARY KEY (kind, value)
+);
+CREATE TABLE IF NOT EXISTS discovered_sources (
+    position INTEGER PRIMARY KEY,
+    domain TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS discovered_domain ON discovered_sources (domain);
+CREATE TABLE IF NOT EXISTS seen_domains (
+    domain TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS url_aliases (
+    url TEXT PRIMARY KEY,  -- normalized
+    canonical TEXT NOT NULL,  -- normalized redirect / rel=canonical target
+    resolved_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS url_aliases_resolved ON url_aliases (resolved_at);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    url TEXT NOT NULL,  -- normalized
+    kind TEXT NOT NULL,  -- "title" or "summary"
+    simhash INTEGER NOT NULL,  -- 64-bit SimHash (stored signed)
+    band0 INTEGER NOT NULL,  -- 16-bit LSH bands, see neardup.py
+    band1 INTEGER NOT NULL,
+    band2 INTEGER NOT NULL,
+    band3 INTEGER NOT NULL,
+    PRIMARY KEY (url, kind)
+);
+CREATE INDEX IF NOT EXISTS fingerprints_band0 ON fingerprints (kind, band0);
+CREATE INDEX IF NOT EXISTS fingerprints_band1 ON fingerprints (kind, band1);
+CREATE INDEX IF NOT EXISTS fingerprints_band2 ON fingerprints (kind, band2);
+CREATE INDEX IF NOT EXISTS fingerprints_band3 ON fingerprints (kind, band3);
+"""
+
+_local = threading.local()
+_state_lock = threading.RLock()  # Held by a run session from start to flush, and by writes outside one
+_index_lock = threading.Lock()
+_url_index = None
+
+
+def connect() -> sqlite3.Connection:
+    """Get this thread's connection, creating and migrating the database if needed."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        with _state_lock:
+            conn = sqlite3.connect(STATE_DB)
+            conn.executescript(SCHEMA)
+            import_text_state(conn)
+            build_source_stats(conn)
+            sync_journals(conn)
+        _local.conn = conn
+    return conn
+
+
+# === RUN SESSION ===
+
+class RunSession:
+    """State cached and changed during one bot run, flushed once at the end."""
+
+    def __init__(self):
+        self.cache = {}  # name -> loaded value
+        self.dirty = {}  # name -> writer(conn, value) to flush
+        self.lookups = {}  # (table, url) -> bool
+        self.journal_lines = {name: [] for name in JOURNALS}
+
+
+def _session():
+    return getattr(_local, "session", None)
+
+
+@contextmanager
+def run_session():
+    """
+    Unit of work for one bot run. Nested sessions join the outer one.
+    Changes are flushed even if the run fails partway - messages that were
+    already sent can't be unsent, so their state has to be kept.
+    Sessions in other threads wait until this one has flushed.
+    """
+    if _session() is not None:
+        yield _session()
+        return
+
+    with _state_lock:
+        conn = connect()
+        session = RunSession()
+        _local.session = session
+        try:
+            yield session
+        finally:
+            _local.session = None
+            _flush(conn, session)
+
+
+def in_run_session(func):
+    """Decorator: run func inside run_session()."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with run_session():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _flush(conn, session: RunSession):
+    try:
+        # Journals first: if we crash before the commit, the next open replays them
+        offsets = {}
+        for name, lines in session.journal_lines.items():
+            if lines:
+                offsets[name] = journal.append_many(JOURNALS[name][0], lines)
+
+        for name, writer in session.dirty.items():
+            writer(conn, session.cache[name])
+        for name, offset in offsets.items():
+            _set_meta(conn, f"{name}_journal_offset", offset)
+        _save_url_index(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    export_text_state(conn)
+
+
+@contextmanager
+def _write():
+    """Write to the database - committed now, or with the run session's flush."""
+    conn = connect()
+    if _session() is not None:
+        yield conn
+    else:
+        with _state_lock, conn:
+            yield conn
+
+
+def _cached(name: str, loader):
+    """Load a piece of state once per run session. Returns a copy the caller can mutate."""
+    session = _session()
+    if session is None:
+        return loader()
+    if name not in session.cache:
+        session.cache[name] = loader()
+    return copy.copy(session.cache[name])
+
+
+def _store(name: str, value, writer):
+    """Replace a piece of state - written now, or once when the run session flushes."""
+    session = _session()
+    if session is None:
+        conn = connect()
+        with _state_lock, conn:
+            writer(conn, value)
+        return
+    session.cache[name] = value
+    session.dirty[name] = writer
+
+
+def _lookup(table: str, url: str, query: str) -> bool:
+    """Indexed membership check, memoized for the run session."""
+    url = normalize_url(url)
+    session = _session()
+    key = (table, url)
+    if session is not None and key in session.lookups:
+        return session.lookups[key]
+    found = connect().execute(query, (url,)).fetchone() is not None
+    if session is not None:
+        session.lookups[key] = found
+    return found
+
+
+def _get_meta(conn, key: str, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_meta(conn, key: str, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+# === TEXT STATE ===
+
+# The mutable tables are exported to these JSON files whenever a run
+# commits, so git carries the state as text and state.db is only a cache:
+# a fresh checkout (or a pull that changed the files) re-imports them.
+TEXT_STATE_FILES = {
+    "queue": DATA_DIR / "queue.json",
+    "pending_review": DATA_DIR / "pending_review.json",
+    "approved": DATA_DIR / "approved.json",
+    "review_candidates": DATA_DIR / "review_candidates.json",
+    "daily_sources": DATA_DIR / "daily_sources.json",
+    "rejected_sources": DATA_DIR / "rejected_sources.json",
+    "discovered_sources": DATA_DIR / "discovered_sources.json",
+    "url_aliases": DATA_DIR / "url_aliases.json",
+    "meta": DATA_DIR / "state_meta.json",
+}
+TEXT_META_KEYS = ("telegram_update_offset", "schedule_%")  # meta rows kept in state_meta.json
+
+_text_state_lock = threading.Lock()
+_text_state_checked = False
+
+
+def _read_json(path: Path, default):
+    if path.exists() and path.stat().st_size > 0:
+        with open(path, "r") as f:
+            return json.load(f)
+    return default
+
+
+def _text_state_hash() -> str:
+    digest = hashlib.sha256()
+    for name, path in TEXT_STATE_FILES.items():
+        digest.update(name.encode())
+        digest.update(path.read_bytes() if path.exists() else b"")
+    return digest.hexdigest()
+
+
+def _dump_text_state(conn) -> dict:
+    """The mutable tables, in the shape of their JSON files."""
+    def rows(query, *args):
+        return [json.loads(row[0]) for row in conn.execute(query, args)]
+
+    daily_date = conn.execute("SELECT MAX(date) FROM daily_sources").fetchone()[0]
+    rejected = {"sources": [], "domains": []}
+    for kind, value in conn.execute("SELECT kind, value FROM rejected_sources ORDER BY rowid"):
+        rejected[f"{kind}s"].append(value)
+    meta_filter = " OR ".join("key LIKE ?" for _ in TEXT_META_KEYS)
+    return {
+        "queue": rows("SELECT data FROM queue ORDER BY position"),
+        "pending_review": rows("SELECT data FROM pending_review ORDER BY position"),
+        "approved": rows("SELECT data FROM approved ORDER BY position"),
+        "review_candidates": rows("SELECT data FROM review_candidates ORDER BY position"),
+        "daily_sources": {
+            "date": daily_date,
+            "sources": [row[0] for row in conn.execute(
+                "SELECT source FROM daily_sources WHERE date = ? ORDER BY rowid", (daily_date,))],
+        },
+        "rejected_sources": rejected,
+        "discovered_sources": {
+            "sources": rows("SELECT data FROM discovered_sources ORDER BY position"),
+            "seen_domains": [row[0] for row in conn.execute("SELECT domain FROM seen_domains ORDER BY rowid")],
+            "last_updated": _get_meta(conn, "discovered_last_updated"),
+        },
+        "url_aliases": {
+            url: [canonical, resolved_at]
+            for url, canonical, resolved_at in conn.execute(
+                "SELECT url, canonical, resolved_at FROM url_aliases ORDER BY url")
+        },
+        "meta": dict(conn.execute(f"SELECT key, value FROM meta WHERE {meta_filter} ORDER BY key", TEXT_META_KEYS)),
+    }
+
+
+def _write_text_state(conn):
+    for name, value in _dump_text_state(conn).items():
+        path = TEXT_STATE_FILES[name]
+        text = json.dumps(value, indent=2)
+        if path.exists() and path.read_text() == text:
+            continue
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(text)
+        os.replace(tmp_path, path)
+    with conn:
+        _set_meta(conn, "text_state_hash", _text_state_hash())
+
+
+def export_text_state(conn: sqlite3.Connection):
+    """Write the mutable tables out to their JSON files (only the files that changed)."""
+    with _text_state_lock:
+        _write_text_state(conn)
+
+
+def _export_at_exit():
+    """Catch writes made outside a run session (schedule marks, rejections) before the process ends."""
+    if STATE_DB.exists():
+        conn = sqlite3.connect(STATE_DB)
+        try:
+            export_text_state(conn)
+        finally:
+            conn.close()
+
+
+def import_text_state(conn: sqlite3.Connection):
+    """
+    Load the JSON state files into the tables if they changed since the
+    last export - a new checkout, a git pull, or an empty database. The
+    first import also loads the posted/ratings snapshots.
+    """
+    global _text_state_checked
+    with _text_state_lock:
+        if _text_state_checked:
+            return
+        _text_state_checked = True
+        atexit.register(_export_at_exit)
+        text_hash = _text_state_hash()
+        stored_hash = _get_meta(conn, "text_state_hash")
+        if stored_hash == text_hash:
+            return
+        if stored_hash is None and _get_meta(conn, "migrated_from_json"):
+            # Database from before the JSON export: it is newer than the files
+            _write_text_state(conn)
+            return
+
+        with conn:
+            if not _get_meta(conn, "migrated_from_json"):
+                for _, _, _, import_snapshot, _ in JOURNALS.values():
+                    import_snapshot(conn)
+                _set_meta(conn, "migrated_from_json", datetime.now().isoformat())
+
+            files = {name: _read_json(path, None) for name, path in TEXT_STATE_FILES.items()}
+            if files["queue"] is not None:
+                _replace_queue(conn, files["queue"])
+            for table in ("pending_review", "approved", "review_candidates"):
+                if files[table] is not None:
+                    _replace_list(conn, table, files[table])
+
+            daily = files["daily_sources"]
+            if daily is not None:
+                conn.execute("DELETE FROM daily_sources")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO daily_sources (date, source) VALUES (?, ?)",
+                    [(daily.get("date"), source) for source in daily.get("sources", [])],
+                )
+
+            rejected = files["rejected_sources"]
+            if rejected is not None:
+                conn.execute("DELETE FROM rejected_sources")
+                for source in rejected.get("sources", []):
+                    conn.execute("INSERT OR IGNORE INTO rejected_sources VALUES ('source', ?)", (source,))
+                for domain in rejected.get("domains", []):
+                    conn.execute("INSERT OR IGNORE INTO rejected_sources VALUES ('domain', ?)", (domain,))
+
+            if files["discovered_sources"]:
+                _replace_discovered(conn, files["discovered_sources"])
+
+            aliases = files["url_aliases"]
+            if aliases is not None:
+                conn.execute("DELETE FROM url_aliases")
+                conn.executemany(
+                    "INSERT INTO url_aliases (url, canonical, resolved_at) VALUES (?, ?, ?)",
+                    [(url, canonical, resolved_at) for url, (canonical, resolved_at) in aliases.items()],
+                )
+                # Canonical URLs of seen articles are in the URL index too
+                _set_meta(conn, "url_index_size", None)
+
+            for key, value in (files["meta"] or {}).items():
+                _set_meta(conn, key, value)
+
+            _set_meta(conn, "text_state_hash", text_hash)
+
+    print("Loaded JSON state files into state.db")
+
+
+# === JOURNALS ===
+
+def _import_posted_snapshot(conn):
+    for url in journal.read_snapshot(POSTED_SNAPSHOT):
+        conn.execute("INSERT OR IGNORE INTO posted (url) VALUES (?)", (normalize_url(url),))
+
+
+def _import_ratings_snapshot(conn):
+    conn.execute("DELETE FROM source_stats")
+    for item in journal.read_snapshot(RATINGS_SNAPSHOT):
+        _insert_rating(conn, item)
+
+
+def _insert_posted(conn, record: dict):
+    conn.execute(
+        "INSERT OR IGNORE INTO posted (url, posted_at) VALUES (?, ?)",
+        (record["url"], record.get("posted_at")),
+    )
+
+
+def _import_fingerprints_snapshot(conn):
+    for record in journal.read_snapshot(FINGERPRINTS_SNAPSHOT):
+        _insert_fingerprint(conn, record)
+
+
+# name -> (journal, snapshot, table, import snapshot, apply record)
+JOURNALS = {
+    "posted": (POSTED_JOURNAL, POSTED_SNAPSHOT, "posted", _import_posted_snapshot, _insert_posted),
+    "ratings": (RATINGS_JOURNAL, RATINGS_SNAPSHOT, "ratings", _import_ratings_snapshot, lambda conn, r: _insert_rating(conn, r)),
+    "fingerprints": (FINGERPRINTS_JOURNAL, FINGERPRINTS_SNAPSHOT, "fingerprints", _import_fingerprints_snapshot,
+                     lambda conn, r: _insert_fingerprint(conn, r)),
+}
+
+
+def sync_journals(conn: sqlite3.Connection):
+    """Apply journal lines the index hasn't seen yet, then compact big journals."""
+    for name, (journal_path, snapshot_path, table, import_snapshot, apply) in JOURNALS.items():
+        offset = int(_get_meta(conn, f"{name}_journal_offset", 0))
+
+        with conn:
+            # Journal is shorter than what we indexed - it was compacted elsewhere, rebuild
+            if journal.size(journal_path) < offset:
+                conn.execute(f"DELETE FROM {table}")
+                import_snapshot(conn)
+                offset = 0
+
+            records, offset = journal.read_from(journal_path, offset)
+            for record in records:
+                apply(conn, record)
+            _set_meta(conn, f"{name}_journal_offset", offset)
+            if records and table != "fingerprints":
+                _set_meta(conn, "url_index_size", None)
+
+        if offset > COMPACT_JOURNAL_BYTES:
+            to_snapshot = (lambda r: r["url"]) if name == "posted" else (lambda r: r)
+            folded = journal.compact(journal_path, snapshot_path, to_snapshot)
+            with conn:
+                _set_meta(conn, f"{name}_journal_offset", 0)
+            print(f"Compacted {folded} {name} events into {snapshot_path.name}")
+
+
+# === URL INDEX ===
+
+def url_index() -> UrlIndex:
+    """Get the seen-URL index, rebuilding it if it doesn't match the tables."""
+    global _url_index
+    if _url_index is not None:
+        return _url_index
+    # Same order as a run session that builds the index: state lock, then index lock
+    with _state_lock, _index_lock:
+        if _url_index is None:
+            conn = connect()
+            index = UrlIndex()
+            if str(len(index)) != _get_meta(conn, "url_index_size"):
+                rows = conn.execute(
+                    "WITH seen AS (SELECT url FROM posted UNION SELECT url FROM ratings) "
+                    "SELECT url FROM seen UNION "
+                    "SELECT canonical FROM url_aliases WHERE url IN (SELECT url FROM seen)"
+                )
+                index = UrlIndex.build(row[0] for row in rows)
+                with conn:
+                    _set_meta(conn, "url_index_size", str(len(index)))
+                print(f"Rebuilt URL index ({len(index)} URLs)")
+            _url_index = index
+        return _url_index
+
+
+def _save_url_index(conn):
+    if _url_index is not None:
+        _url_index.save()
+        _set_meta(conn, "url_index_size", str(len(_url_index)))
+
+
+# === POSTED / RATINGS ===
+
+def _record(name: str, record: dict, apply, url: str = None):
+    """Journal an event and apply it to its table (indexing url as seen, if given)."""
+    if url is not None:
+        url_index().add_hash(url_hash(url))
+    session = _session()
+    if session is not None:
+        session.journal_lines[name].append(record)
+        apply(connect(), record)
+        return
+    conn = connect()
+    with _state_lock, conn:
+        offset = journal.append(JOURNALS[name][0], record)
+        apply(conn, record)
+        _set_meta(conn, f"{name}_journal_offset", offset)
+        _save_url_index(conn)
+
+
+def add_posted(url: str):
+    """Mark a URL as posted (one journal line)."""
+    url = normalize_url(url)
+    if is_posted(url):
+        return
+    _record("posted", {"url": url, "posted_at": datetime.now().isoformat()}, _insert_posted, url)
+    canonical = get_alias(url)
+    if canonical is not None and canonical != url:
+        url_index().add_hash(url_hash(canonical))
+    if _session() is not None:
+        _session().lookups[("posted", url)] = True
+
+
+def is_posted(url: str) -> bool:
+    return _lookup("posted", url, "SELECT 1 FROM posted WHERE url = ?")
+
+
+def is_reviewed(url: str) -> bool:
+    """Check if a URL has been rated in training/review."""
+    return _lookup("ratings", url, "SELECT 1 FROM ratings WHERE url = ? LIMIT 1")
+
+
+def is_rated_good(url: str) -> bool:
+    return _lookup("good_ratings", url, "SELECT 1 FROM ratings WHERE url = ? AND rating = 'good' LIMIT 1")
+
+
+def is_seen(url: str) -> bool:
+    """Check if a URL (or its known canonical URL) has been posted or reviewed already."""
+    if url in url_index():
+        return True
+    canonical = get_alias(url)
+    return canonical is not None and canonical in url_index()
+
+
+def _insert_rating(conn, item: dict):
+    conn.execute(
+        "INSERT INTO ratings (url, source, rating, data) VALUES (?, ?, ?, ?)",
+        (normalize_url(item.get("url", "")), item.get("source", "Unknown"), item.get("rating", ""), json.dumps(item)),
+    )
+    _count_rating(conn, item)
+
+
+def add_rating(item: dict):
+    """Record a rated article (one training log journal line)."""
+    url = normalize_url(item.get("url", ""))
+    record = dict(item)
+    record.setdefault("rated_at", datetime.now().isoformat())
+    _record("ratings", record, _insert_rating, url)
+    canonical = get_alias(url)
+    if canonical is not None and canonical != url:
+        url_index().add_hash(url_hash(canonical))
+    session = _session()
+    if session is not None:
+        session.lookups[("ratings", url)] = True
+        if item.get("rating") == "good":
+            session.lookups[("good_ratings", url)] = True
+
+
+def get_ratings(offset: int = 0) -> list:
+    """Get ratings in the order they were made, skipping the first offset."""
+    rows = connect().execute("SELECT data FROM ratings ORDER BY id LIMIT -1 OFFSET ?", (offset,)).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+def count_ratings() -> int:
+    return connect().execute("SELECT COUNT(*) FROM ratings").fetchone()[0]
+
+
+# === SOURCE TRUST AGGREGATES ===
+
+def _rating_time(item: dict) -> float:
+    for key in ("rated_at", "sent_at"):
+        try:
+            return datetime.fromisoformat(item[key]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            pass
+    return time.time()
+
+
+def _count_rating(conn, item: dict):
+    """Fold one rating into its source's counters."""
+    rating = item.get("rating")
+    if rating not in ("good", "bad"):
+        return
+    source = item.get("source", "Unknown")
+    rated_at = _rating_time(item)
+    row = conn.execute(
+        "SELECT good, bad, good_weight, bad_weight, decayed_at FROM source_stats WHERE source = ?", (source,)
+    ).fetchone()
+    good, bad, good_weight, bad_weight, decayed_at = row or (0, 0, 0.0, 0.0, rated_at)
+
+    weight = 1.0
+    if TRUST_HALF_LIFE_DAYS > 0:
+        half_life = TRUST_HALF_LIFE_DAYS * 86400
+        if rated_at >= decayed_at:
+            # Decay the existing weights up to this rating
+            factor = 0.5 ** ((rated_at - decayed_at) / half_life)
+            good_weight *= factor
+            bad_weight *= factor
+            decayed_at = rated_at
+        else:
+            weight = 0.5 ** ((decayed_at - rated_at) / half_life)
+
+    if rating == "good":
+        good, good_weight = good + 1, good_weight + weight
+    else:
+        bad, bad_weight = bad + 1, bad_weight + weight
+    conn.execute(
+        "INSERT OR REPLACE INTO source_stats (source, good, bad, good_weight, bad_weight, decayed_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (source, good, bad, good_weight, bad_weight, decayed_at),
+    )
+
+
+def build_source_stats(conn: sqlite3.Connection):
+    """Recount source_stats from the ratings table (once, or when the half-life setting changes)."""
+    if _get_meta(conn, "source_stats_half_life") == str(TRUST_HALF_LIFE_DAYS):
+        return
+    with conn:
+        conn.execute("DELETE FROM source_stats")
+        for (data,) in conn.execute("SELECT data FROM ratings ORDER BY id").fetchall():
+            _count_rating(conn, json.loads(data))
+        _set_meta(conn, "source_stats_half_life", str(TRUST_HALF_LIFE_DAYS))
+
+
+def source_rating_counts() -> dict:
+    """Get {source: {"good": n, "bad": n}} for every rated source."""
+    rows = connect().execute("SELECT source, good, bad FROM source_stats")
+    return {source: {"good": good, "bad": bad} for source, good, bad in rows}
+
+
+def source_trust_scores() -> dict:
+    """Get {source: share of good ratings}, time-decayed if TRUST_HALF_LIFE_DAYS is set."""
+    # Both weights of a source are decayed to the same moment, so their ratio is current
+    rows = connect().execute("SELECT source, good_weight, bad_weight FROM source_stats")
+    return {source: good / (good + bad) for source, good, bad in rows if good + bad > 0}
+
+
+def rating_counts() -> dict:
+    """Get {"good": n, "bad": n} across all ratings."""
+    good, bad = connect().execute("SELECT SUM(good), SUM(bad) FROM source_stats").fetchone()
+    return {"good": good or 0, "bad": bad or 0}
+
+
+# === QUEUE / PENDING / APPROVED / REVIEW CANDIDATES ===
+
+def _replace_list(conn, table: str, items: list):
+    conn.execute(f"DELETE FROM {table}")
+    conn.executemany(
+        f"INSERT INTO {table} (position, data) VALUES (?, ?)",
+        [(i, json.dumps(item)) for i, item in enumerate(items)],
+    )
+
+
+def _load_list(table: str) -> list:
+    rows = connect().execute(f"SELECT data FROM {table} ORDER BY position").fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+def _replace_queue(conn, queue: list):
+    conn.execute("DELETE FROM queue")
+    conn.executemany(
+        "INSERT INTO queue (position, url, source, score, data) VALUES (?, ?, ?, ?, ?)",
+        [
+            (i, normalize_url(a.get("link", "")), a.get("source", ""), a.get("score", 0), json.dumps(a))
+            for i, a in enumerate(queue)
+        ],
+    )
+
+
+def get_queue() -> list:
+    return _cached("queue", lambda: _load_list("queue"))
+
+
+def save_queue(queue: list):
+    _store("queue", list(queue), _replace_queue)
+
+
+def get_pending() -> list:
+    return _cached("pending_review", lambda: _load_list("pending_review"))
+
+
+def save_pending(pending: list):
+    _store("pending_review", list(pending), lambda conn, items: _replace_list(conn, "pending_review", items))
+
+
+def get_approved() -> list:
+    return _cached("approved", lambda: _load_list("approved"))
+
+
+def save_approved(approved: list):
+    _store("approved", list(approved), lambda conn, items: _replace_list(conn, "approved", items))
+
+
+def get_review_candidates() -> list:
+    """Articles from discovered sources, fetched by the crawl step, waiting to be sent for review."""
+    return _cached("review_candidates", lambda: _load_list("review_candidates"))
+
+
+def save_review_candidates(candidates: list):
+    _store("review_candidates", list(candidates), lambda conn, items: _replace_list(conn, "review_candidates", items))
+
+
+# === DAILY / REJECTED SOURCES ===
+
+def get_daily_sources(date: str) -> set:
+    def load():
+        rows = connect().execute("SELECT source FROM daily_sources WHERE date = ?", (date,))
+        return {row[0] for row in rows}
+    return _cached(f"daily_sources:{date}", load)
+
+
+def add_daily_source(date: str, source: str):
+    """Record a source as posted on date, dropping older days."""
+    sources = get_daily_sources(date)
+    sources.add(source)
+    with _write() as conn:
+        conn.execute("DELETE FROM daily_sources WHERE date != ?", (date,))
+        conn.execute("INSERT OR IGNORE INTO daily_sources (date, source) VALUES (?, ?)", (date, source))
+    if _session() is not None:
+        _session().cache[f"daily_sources:{date}"] = sources
+
+
+def get_rejected() -> dict:
+    """Get rejected sources as {"sources": [...], "domains": [...]}."""
+    def load():
+        rejected = {"sources": [], "domains": []}
+        for kind, value in connect().execute("SELECT kind, value FROM rejected_sources ORDER BY rowid"):
+            rejected[f"{kind}s"].append(value)
+        return rejected
+    return copy.deepcopy(_cached("rejected_sources", load))
+
+
+def add_rejected(kind: str, value: str) -> bool:
+    """Add a rejected "source" or "domain". Returns False if it was already there."""
+    with _write() as conn:
+        cursor = conn.execute("INSERT OR IGNORE INTO rejected_sources (kind, value) VALUES (?, ?)", (kind, value))
+    session = _session()
+    if cursor.rowcount > 0 and session is not None and "rejected_sources" in session.cache:
+        session.cache["rejected_sources"][f"{kind}s"].append(value)
+    return cursor.rowcount > 0
+
+
+# === DISCOVERED SOURCES ===
+
+def _replace_discovered(conn, data: dict):
+    conn.execute("DELETE FROM discovered_sources")
+    conn.executemany(
+        "INSERT INTO discovered_sources (position, domain, data) VALUES (?, ?, ?)",
+        [(i, s.get("domain", ""), json.dumps(s)) for i, s in enumerate(data.get("sources", []))],
+    )
+    conn.execute("DELETE FROM seen_domains")
+    conn.executemany("INSERT OR IGNORE INTO seen_domains (domain) VALUES (?)", [(d,) for d in data.get("seen_domains", [])])
+    _set_meta(conn, "discovered_last_updated", data.get("last_updated"))
+
+
+def load_discovered() -> dict:
+    """Get discovered sources in the same shape as the old discovered_sources.json."""
+    def load():
+        conn = connect()
+        sources = [json.loads(row[0]) for row in conn.execute("SELECT data FROM discovered_sources ORDER BY position")]
+        seen = [row[0] for row in conn.execute("SELECT domain FROM seen_domains ORDER BY rowid")]
+        return {
+            "sources": sources,
+            "seen_domains": seen,
+            "last_updated": _get_meta(conn, "discovered_last_updated"),
+        }
+    return copy.deepcopy(_cached("discovered_sources", load))
+
+
+def save_discovered(data: dict):
+    _store("discovered_sources", copy.deepcopy(data), _replace_discovered)
+
+
+# === URL ALIASES ===
+
+ALIAS_TTL = 30 * 24 * 3600  # Re-resolve redirects / canonical links after 30 days
+
+
+def get_alias(url: str):
+    """Cached canonical URL for a URL, or None if unknown or expired."""
+    row = connect().execute(
+        "SELECT canonical FROM url_aliases WHERE url = ? AND resolved_at > ?",
+        (normalize_url(url), time.time() - ALIAS_TTL),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def set_alias(url: str, canonical: str):
+    with _write() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO url_aliases (url, canonical, resolved_at) VALUES (?, ?, ?)",
+            (normalize_url(url), normalize_url(canonical), time.time()),
+        )
+
+
+def prune_aliases():
+    """Drop aliases past their TTL."""
+    with _write() as conn:
+        conn.execute("DELETE FROM url_aliases WHERE resolved_at <= ?", (time.time() - ALIAS_TTL,))
+
+
+# === NEAR-DUPLICATE FINGERPRINTS ===
+
+def _signed(value: int) -> int:
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _insert_fingerprint(conn, record: dict):
+    conn.execute(
+        "INSERT OR REPLACE INTO fingerprints (url, kind, simhash, band0, band1, band2, band3) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (record["url"], record["kind"], _signed(record["simhash"]), *record["bands"]),
+    )
+
+
+def add_fingerprint(url: str, kind: str, simhash: int, bands: list):
+    """Record a title/summary fingerprint (one fingerprint journal line)."""
+    record = {"url": normalize_url(url), "kind": kind, "simhash": simhash, "bands": list(bands)}
+    _record("fingerprints", record, _insert_fingerprint)
+
+
+def fingerprint_candidates(kind: str, bands: list) -> list:
+    """Get (url, simhash) for fingerprints sharing at least one band with these."""
+    # One indexed lookup per band (an OR across columns would scan every row of this kind)
+    query = " UNION ".join(
+        f"SELECT url, simhash FROM fingerprints WHERE kind = ? AND band{i} = ?" for i in range(len(bands))
+    )
+    rows = connect().execute(query, [value for band in bands for value in (kind, band)])
+    return [(url, simhash & ((1 << 64) - 1)) for url, simhash in rows]
+
+
+def has_fingerprints() -> bool:
+    return connect().execute("SELECT 1 FROM fingerprints LIMIT 1").fetchone() is not None
+
+
+# === TELEGRAM UPDATES ===
+
+def get_update_offset() -> int:
+    """Offset for the next getUpdates call (last handled update_id + 1, 0 if none yet)."""
+    return int(_get_meta(connect(), "telegram_update_offset", 0))
+
+
+def save_update_offset(offset: int):
+    """Acknowledge updates before offset - committed with the rest of the run's changes."""
+    with _write() as conn:
+        _set_meta(conn, "telegram_update_offset", int(offset))
+
+
+# === SCHEDULE ===
+
+def get_schedule_mark(job: str):
+    """Epoch seconds of the last slot a scheduled job ran for, or None."""
+    value = _get_meta(connect(), f"schedule_{job}")
+    return float(value) if value is not None else None
+
+
+def save_schedule_mark(job: str, slot: float):
+    with _write() as conn:
+        _set_meta(conn, f"schedule_{job}", slot)
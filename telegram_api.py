@@ -0,0 +1,27 @@
+"""
+Telegram Bot API basics for Brain Candy Bot
+
+The bot token, the API server (TELEGRAM_API_BASE, for the local stand-in
+in fake_telegram.py) and one helper to call a Bot API method through the
+shared HTTP session. Sending goes through the outbox (outbox.py).
+"""
+
+import os
+
+import http_client
+
+TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "YOUR_TOKEN_HERE")
+# Bot API server - point at a local stand-in (fake_telegram.py) to run offline
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+
+
+def method_url(method: str) -> str:
+    return f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/{method}"
+
+
+def call(method: str, payload: dict = None, timeout=None):
+    """POST a Bot API method. Returns the raw response (callers check status and "ok")."""
+    kwargs = {"json": payload or {}}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    return http_client.post(method_url(method), **kwargs)
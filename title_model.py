@@ -0,0 +1,130 @@
+"""
+Learned title classifier for Brain Candy Bot
+
+A naive Bayes model over hashed title words and word pairs, trained on
+the good/bad ratings in the training log. Training is just counting, so
+the model catches up with new ratings incrementally: it remembers how
+many ratings it has seen and only reads the ones after that.
+
+The counts are saved to title_model.npz (a few KB). Scoring a title is a
+single sparse dot product of its hashed features with the per-feature
+log-likelihood ratios.
+"""
+
+import os
+import re
+import threading
+import zlib
+from itertools import chain
+from pathlib import Path
+
+import numpy as np
+
+import state
+
+DATA_DIR = Path(os.environ.get("BRAIN_CANDY_DATA_DIR") or Path(__file__).parent)
+TITLE_MODEL_FILE = DATA_DIR / "title_model.npz"
+
+HASH_BITS = 18  # 2^18 hashed feature slots
+MIN_RATINGS = 20  # Don't score with the model until it has seen this many good+bad ratings
+SMOOTHING = 1.0  # Laplace smoothing for the feature counts
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+_lock = threading.Lock()
+_model = None
+
+
+def title_features(title: str) -> list:
+    """Sorted hashed feature ids for a title's words and adjacent word pairs."""
+    words = WORD_RE.findall(title.lower())
+    tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    mask = (1 << HASH_BITS) - 1
+    # crc32 rather than hash(): it's stable across processes
+    return sorted({zlib.crc32(t.encode("utf-8")) & mask for t in tokens})
+
+
+class TitleModel:
+    """Naive Bayes counts for good and bad titles."""
+
+    def __init__(self, features=(), good=(), bad=(), docs=(0, 0), trained=0):
+        self.counts = {int(f): [int(g), int(b)] for f, g, b in zip(features, good, bad)}  # feature -> [good, bad]
+        self.docs = list(docs)  # [good titles, bad titles]
+        self.trained = trained  # Ratings seen so far
+        self._weights = None
+
+    def learn(self, title: str, rating: str):
+        if rating not in ("good", "bad"):
+            return
+        label = 0 if rating == "good" else 1
+        self.docs[label] += 1
+        for feature in title_features(title):
+            self.counts.setdefault(feature, [0, 0])[label] += 1
+        self._weights = None
+
+    @property
+    def ready(self) -> bool:
+        return sum(self.docs) >= MIN_RATINGS and min(self.docs) > 0
+
+    def _compile(self):
+        """Per-feature log-likelihood ratios as a dense vector (unseen features weigh 0)."""
+        weights = np.zeros(1 << HASH_BITS)
+        if self.counts:
+            features = np.fromiter(self.counts, dtype=np.int64, count=len(self.counts))
+            counts = np.array(list(self.counts.values()), dtype=np.float64)
+            totals = counts.sum(axis=0) + SMOOTHING * len(self.counts)
+            weights[features] = np.log((counts[:, 0] + SMOOTHING) / totals[0]) - np.log((counts[:, 1] + SMOOTHING) / totals[1])
+        self._weights = weights
+        self._bias = float(np.log(max(self.docs[0], 1) / max(self.docs[1], 1)))
+
+    def probabilities(self, titles: list) -> np.ndarray:
+        """P(good) for each title."""
+        if self._weights is None:
+            self._compile()
+        features = [title_features(t) for t in titles]
+        if not features:
+            return np.zeros(0)
+        rows = np.repeat(np.arange(len(features)), [len(f) for f in features])
+        flat = np.fromiter(chain.from_iterable(features), dtype=np.int64, count=len(rows))
+        logits = self._bias + np.bincount(rows, weights=self._weights[flat], minlength=len(features))
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def probability(self, title: str) -> float:
+        return float(self.probabilities([title])[0])
+
+    def save(self, path: Path = TITLE_MODEL_FILE):
+        features = np.array(sorted(self.counts), dtype=np.uint32)
+        counts = np.array([self.counts[f] for f in features.tolist()], dtype=np.uint32).reshape(-1, 2)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez_compressed(
+            tmp_path, features=features, good=counts[:, 0], bad=counts[:, 1],
+            docs=np.array(self.docs, dtype=np.int64), trained=np.array(self.trained, dtype=np.int64),
+        )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path = TITLE_MODEL_FILE) -> "TitleModel":
+        if not path.exists():
+            return cls()
+        with np.load(path) as data:
+            return cls(data["features"], data["good"], data["bad"], data["docs"].tolist(), int(data["trained"]))
+
+
+def get_model():
+    """The title model, caught up with the rating history. None until it has enough ratings."""
+    global _model
+    with _lock:
+        if _model is None:
+            _model = TitleModel.load()
+
+        total = state.count_ratings()
+        if total < _model.trained:
+            # Rating history was rebuilt - start over
+            _model = TitleModel()
+        if total > _model.trained:
+            for item in state.get_ratings(_model.trained):
+                _model.learn(item.get("title", ""), item.get("rating"))
+            _model.trained = total
+            _model.save()
+
+        return _model if _model.ready else None
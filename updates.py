@@ -0,0 +1,89 @@
+"""
+Telegram update consumer for Brain Candy Bot
+
+Reads updates (Andy's replies) with getUpdates long polling. The offset
+of the last update handled is stored in state.db, so each update is
+downloaded once and acknowledged by the next call, instead of
+re-downloading the whole backlog and making a second call to clear it.
+
+The offset is saved in the same run session as whatever the handler
+changed, so a run that dies mid-batch gets the unacknowledged updates
+again next time rather than losing them. The long poll itself runs
+outside the session, so waiting for Andy never holds up other jobs'
+state changes.
+
+Telegram allows one getUpdates caller at a time per bot: a 409 means
+another process (e.g. `python main.py --listen`) is already polling.
+"""
+
+import time
+
+import state
+import telegram_api
+
+LONG_POLL_TIMEOUT = 25  # Seconds Telegram holds getUpdates open when there's nothing new
+ALLOWED_UPDATES = ["message", "callback_query"]
+ERROR_BACKOFF = 5  # Seconds to wait after a failed poll in the continuous loop
+
+
+def fetch_updates(timeout: int = 0) -> list:
+    """
+    Updates after the stored offset, or None if the call failed. timeout > 0
+    long polls: the call returns as soon as an update arrives, or empty after
+    timeout seconds.
+    """
+    payload = {
+        "offset": state.get_update_offset(),
+        "timeout": timeout,
+        "allowed_updates": ALLOWED_UPDATES,
+    }
+    try:
+        # Read timeout must outlast the long poll
+        response = telegram_api.call("getUpdates", payload, timeout=(5, timeout + 10))
+        if response.status_code == 200:
+            return response.json().get("result", [])
+        if response.status_code == 409:
+            print("Another process is polling for updates")
+        else:
+            print(f"getUpdates error: {response.status_code}")
+    except Exception as e:
+        print(f"Error getting updates: {e}")
+    return None
+
+
+def consume(handler, timeout: int = 0) -> int:
+    """
+    Fetch new updates, pass them to handler(updates) as one batch, and
+    acknowledge them. Returns the number of updates handled, or None if
+    fetching failed.
+    """
+    updates = fetch_updates(timeout)
+    if not updates:
+        return updates
+    with state.run_session():
+        if state.get_update_offset() > updates[0]["update_id"]:
+            # Another thread handled this batch while we were polling
+            return 0
+        try:
+            handler(updates)
+        except Exception as e:
+            # A bad batch shouldn't come back forever and block the updates behind it
+            print(f"Error handling updates {updates[0]['update_id']}-{updates[-1]['update_id']}: {e}")
+        state.save_update_offset(updates[-1]["update_id"] + 1)
+    return len(updates)
+
+
+def poll(handler, timeout: int = LONG_POLL_TIMEOUT):
+    """One long poll; waits ERROR_BACKOFF after a failure so callers can loop on it."""
+    try:
+        if consume(handler, timeout) is not None:
+            return
+    except Exception as e:
+        print(f"Update loop error: {e}")
+    time.sleep(ERROR_BACKOFF)
+
+
+def run_forever(handler, timeout: int = LONG_POLL_TIMEOUT):
+    """Long poll continuously, handling updates as soon as they arrive."""
+    while True:
+        poll(handler, timeout)
@@ -0,0 +1,106 @@
+"""
+Dedup index of URLs already posted or reviewed
+
+A sorted file of fixed-width 64-bit hashes of normalized URLs
+(seen_urls.idx). It is memory-mapped, so membership is a binary search
+over the file with no per-run load or normalization pass. New URLs are
+kept in memory and merged into the file when it is saved.
+"""
+
+import hashlib
+import heapq
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from urls import normalize_url
+
+DATA_DIR = Path(os.environ.get("BRAIN_CANDY_DATA_DIR") or Path(__file__).parent)
+URL_INDEX_FILE = DATA_DIR / "seen_urls.idx"
+
+
+def url_hash(normalized_url: str) -> int:
+    """64-bit hash of an already-normalized URL."""
+    digest = hashlib.blake2b(normalized_url.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class UrlIndex:
+    """Sorted, memory-mapped set of URL hashes with an in-memory tail of new ones."""
+
+    def __init__(self, path: Path = URL_INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._mmap = None
+        self._hashes = ()  # memoryview of native uint64s over the mmap
+        self._new = set()
+        self._open()
+
+    def _open(self):
+        if self.path.exists() and self.path.stat().st_size > 0:
+            self._file = open(self.path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._hashes = memoryview(self._mmap).cast("Q")
+
+    def _close(self):
+        if self._mmap is not None:
+            self._hashes.release()
+            self._mmap.close()
+            self._file.close()
+        self._file = None
+        self._mmap = None
+        self._hashes = ()
+
+    def __len__(self) -> int:
+        return len(self._hashes) + len(self._new)
+
+    def contains_hash(self, h: int) -> bool:
+        with self._lock:
+            if h in self._new:
+                return True
+            i = bisect_left(self._hashes, h)
+            return i < len(self._hashes) and self._hashes[i] == h
+
+    def __contains__(self, url: str) -> bool:
+        return self.contains_hash(url_hash(normalize_url(url)))
+
+    def add(self, url: str):
+        self.add_hash(url_hash(normalize_url(url)))
+
+    def add_hash(self, h: int):
+        with self._lock:
+            self._new.add(h)
+
+    def save(self):
+        """Merge new hashes into the sorted file."""
+        with self._lock:
+            if not self._new:
+                return
+            merged = array("Q")
+            last = None
+            for h in heapq.merge(self._hashes, sorted(self._new)):
+                if h != last:
+                    merged.append(h)
+                    last = h
+
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                merged.tofile(f)
+            self._close()
+            os.replace(tmp_path, self.path)
+            self._new.clear()
+            self._open()
+
+    @classmethod
+    def build(cls, normalized_urls, path: Path = URL_INDEX_FILE) -> "UrlIndex":
+        """Build a fresh index file from already-normalized URLs."""
+        hashes = array("Q", sorted({url_hash(url) for url in normalized_urls}))
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            hashes.tofile(f)
+        os.replace(tmp_path, path)
+        return cls(path)
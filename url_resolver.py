@@ -0,0 +1,86 @@
+"""
+Redirect / canonical URL resolution for Brain Candy Bot
+
+The same essay often shows up under several URLs (an HN link, a Substack
+custom domain, a feed link). This resolves a URL's redirect chain and its
+rel=canonical target, caches the answer in the state store with a TTL,
+and caps how many URLs get resolved over the network per run.
+"""
+
+import re
+from urllib.parse import urljoin
+
+import http_client
+import state
+from urls import normalize_url
+
+MAX_RESOLVES_PER_RUN = 20  # Network lookups per run; everything else uses the cache
+CANONICAL_SCAN_BYTES = 32 * 1024  # <link rel=canonical> lives in <head>
+
+LINK_TAG = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+REL_CANONICAL = re.compile(r"""\brel\s*=\s*["']?canonical\b""", re.IGNORECASE)
+HREF = re.compile(r"""\bhref\s*=\s*["']([^"']+)["']""", re.IGNORECASE)
+
+_budget = MAX_RESOLVES_PER_RUN
+
+
+def reset_budget():
+    """Start a new run's allowance of network lookups."""
+    global _budget
+    _budget = MAX_RESOLVES_PER_RUN
+    state.prune_aliases()
+
+
+def _find_canonical_link(html: str):
+    for tag in LINK_TAG.findall(html):
+        if REL_CANONICAL.search(tag):
+            href = HREF.search(tag)
+            if href:
+                return href.group(1)
+    return None
+
+
+def _resolve(url: str) -> str:
+    """Follow redirects with a HEAD, then look for a canonical link."""
+    response = http_client.head(url, allow_redirects=True)
+    final_url = response.url or url
+
+    # Some servers send the canonical as a Link: <...>; rel="canonical" header
+    canonical = response.links.get("canonical", {}).get("url")
+    if canonical:
+        return urljoin(final_url, canonical)
+
+    if "html" not in response.headers.get("content-type", "").lower():
+        return final_url
+
+    # Read just the start of the page for <link rel=canonical>
+    with http_client.get(final_url, stream=True) as page:
+        head = page.raw.read(CANONICAL_SCAN_BYTES, decode_content=True)
+    canonical = _find_canonical_link(head.decode("utf-8", errors="ignore"))
+    return urljoin(final_url, canonical) if canonical else final_url
+
+
+def resolve_canonical(url: str) -> str:
+    """
+    Normalized canonical URL for url. Uses the cache when possible and
+    only goes to the network while this run's budget lasts.
+    """
+    global _budget
+
+    normalized = normalize_url(url)
+    cached = state.get_alias(normalized)
+    if cached is not None:
+        return cached
+
+    if _budget <= 0:
+        return normalized
+    _budget -= 1
+
+    try:
+        canonical = normalize_url(_resolve(url))
+    except Exception as e:
+        print(f"Could not resolve {url}: {e}")
+        canonical = normalized
+
+    state.set_alias(normalized, canonical)
+    return canonical
@@ -0,0 +1,41 @@
+"""
+URL helpers for Brain Candy Bot
+"""
+
+from functools import lru_cache
+from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
+
+NORMALIZE_CACHE_SIZE = 65536  # Bounded LRU - the same URLs get normalized over and over
+
+TRACKING_PARAMS = frozenset({"utm_source", "utm_medium", "utm_campaign", "utm_content", "utm_term", "ref", "source"})
+
+
+def fix_known_redirects(url: str) -> str:
+    """Fix known broken/redirect URLs from feeds."""
+    # Vitalik's blog moved from vitalik.ca to vitalik.eth.limo
+    if "vitalik.ca/" in url:
+        url = url.replace("vitalik.ca/", "vitalik.eth.limo/")
+    return url
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_url(url: str) -> str:
+    """Normalize URL for deduplication only - don't use for posting."""
+    if not url:
+        return url
+
+    parsed = urlparse(url)
+
+    # Force https, lowercase domain only (not path)
+    scheme = "https"
+    netloc = parsed.netloc.lower()
+
+    # Remove trailing slash from path (keep original case)
+    path = parsed.path.rstrip("/")
+
+    # Remove tracking parameters
+    query_params = parse_qs(parsed.query)
+    filtered_params = {k: v for k, v in query_params.items() if k.lower() not in TRACKING_PARAMS}
+    query = urlencode(filtered_params, doseq=True) if filtered_params else ""
+
+    return urlunparse((scheme, netloc, path, "", query, ""))